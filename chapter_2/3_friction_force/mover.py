@@ -103,5 +103,5 @@ class Mover(pyglet.shapes.Circle):
             self.pos[1] = self.radius
             self.velocity[1] *= -1
         elif self.pos[1] >= self.canvas_h - self.radius:
-            self.pos[1] = self.canvas_w - self.radius
+            self.pos[1] = self.canvas_h - self.radius
             self.velocity[1] *= -1
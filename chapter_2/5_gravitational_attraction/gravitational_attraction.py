@@ -34,7 +34,9 @@ canvas.push_handlers(mouse_buttons)
 # Define drawing batch and sprites
 main_batch = pyglet.graphics.Batch()
 movers = mover_list(10, main_batch)
-attractor = Attractor(mass=100, x=200, y=200, batch=main_batch, color=(255,0,100))
+
+# Every attractor pulls every mover, add more to the list for more wells
+attractors = [Attractor(mass=100, x=200, y=200, batch=main_batch, color=(255,0,100))]
 
 def canvas_update(dt):
     """Updates the canvas according to the frame rate dt.
@@ -43,7 +45,8 @@ def canvas_update(dt):
         dt (float): frame rate
     """
     for mover in movers:
-        attractor.attract(mover)
+        for attractor in attractors:
+            attractor.attract(mover)
         mover.update(dt)
 
 
@@ -96,5 +96,5 @@ class Mover(pyglet.shapes.Circle):
             self.pos.y = self.radius
             self.velocity.y *= -1
         elif self.pos.y >= self.canvas_h - self.radius:
-            self.pos.y = self.canvas_w - self.radius
+            self.pos.y = self.canvas_h - self.radius
             self.velocity.y *= -1
@@ -0,0 +1,205 @@
+"""Adaptive step sizes for close gravitational encounters
+
+With a fixed dt, a close pass between two bodies is integrated with the same
+step as the quietest body of the scene. The distance clamp of Mover.attract()
+([100, 1000] for the squared distance) partly hides the resulting
+instability. AdaptiveTimestep instead sizes the step from the motion of
+every body:
+
+    dt_i = eta * min(sqrt(length / |a_i|), length / |v_i|)
+
+i.e. no body moves by more than about eta * length in one step, nor changes
+its velocity too much. Quiet scenes run with steps up to dt_max, many times
+larger than the usual 1/240 s, and the clamp can be lowered (e.g.
+min_distance_sq=1) without the bodies blowing up.
+
+Two modes:
+
+- global: all bodies share the smallest step of the scene
+- per body (block timesteps): every body gets a power of two fraction of
+  dt_max. Bodies only evaluate their forces at the end of their own steps,
+  so one close pair does not slow down the whole scene.
+
+The integration is kick-drift-kick leapfrog in physical units, like the
+"euler", "verlet" and "rk4" integrators (forces scaled by dt), not the per
+tick forces of "legacy". The integrator of the simulation is not used.
+"""
+import argparse
+import numpy as np
+
+
+class AdaptiveTimestep:
+    """Advances a simulation with step sizes adapted to the bodies
+
+    Every call to advance() covers the given duration with one or more
+    "blocks" of at most dt_max. Each block is one tick of the simulation:
+    the boundary is applied before it, collisions and observers after it.
+    Step sizes are chosen at the start of each block.
+
+    Args:
+        simulation (Simulation): The simulation to advance
+        eta (float, optional): Accuracy parameter, smaller is more accurate
+        length (float, optional): Length scale of the criterion in pixels,
+                                  e.g. the distance at which the force is clamped
+        dt_max (float, optional): Largest step, the size of a block
+        max_level (int, optional): Smallest step is dt_max / 2**max_level
+        per_body (bool, optional): Block timesteps, see the module documentation
+    """
+
+    def __init__(self, simulation, eta=0.05, length=10.0, dt_max=1/30.0, max_level=12,
+                 per_body=False):
+        self.simulation = simulation
+        self.eta = eta
+        self.length = length
+        self.dt_max = dt_max
+        self.max_level = max_level
+        self.per_body = per_body
+        self.evaluations = 0
+        self.steps = 0
+        self._acceleration = None
+        self._revision = None
+
+    def reset(self):
+        """Forgets the accelerations kept between blocks, e.g. after changing forces
+        """
+        self._acceleration = None
+
+    def step_sizes(self, velocity, acceleration):
+        """Step size wanted by every body
+
+        Args:
+            velocity (numpy.ndarray): Velocity of every body, shape (N, 2)
+            acceleration (numpy.ndarray): Acceleration of every body, shape (N, 2)
+
+        Returns:
+            numpy.ndarray: Step of every body in seconds, at most dt_max
+        """
+        speed = np.sqrt(np.einsum("ij,ij->i", velocity, velocity))
+        accel = np.sqrt(np.einsum("ij,ij->i", acceleration, acceleration))
+        with np.errstate(divide="ignore"):
+            dt = self.eta * np.minimum(np.sqrt(self.length / accel), self.length / speed)
+        return np.minimum(dt, self.dt_max)
+
+    def levels(self, dt, block):
+        """Power of two level of every body: a body at level k takes steps of block / 2**k
+
+        Args:
+            dt (numpy.ndarray): Step wanted by every body
+            block (float): Duration of the block
+
+        Returns:
+            numpy.ndarray: Level of every body, between 0 and max_level
+        """
+        with np.errstate(divide="ignore"):
+            levels = np.ceil(np.log2(block / dt))
+        levels = np.clip(levels, 0, self.max_level).astype(np.int64)
+        if not self.per_body and len(levels):
+            levels[:] = levels.max()
+        return levels
+
+    def advance(self, duration):
+        """Advances the simulation by a duration in seconds
+
+        Args:
+            duration (float): Simulated time to cover
+
+        Returns:
+            int: Number of blocks (simulation ticks) taken
+        """
+        blocks = 0
+        remaining = duration
+        while remaining > 1e-12 * duration:
+            block = min(self.dt_max, remaining)
+            self.step_block(block)
+            remaining -= block
+            blocks += 1
+        return blocks
+
+    def step_block(self, block):
+        """Advances the simulation by one block of duration at most dt_max
+
+        Args:
+            block (float): Duration of the block
+        """
+        simulation = self.simulation
+        system = simulation.system
+        if simulation.boundary is not None:
+            simulation.boundary.apply(system)
+
+        a = self._acceleration
+        if a is None or self._revision != system.revision:
+            a = simulation.acceleration(system.pos, system.velocity)
+            self.evaluations += len(a)
+        external = system.acceleration
+
+        levels = self.levels(self.step_sizes(system.velocity, a + external), block)
+        top = int(levels.max(initial=0))
+        substeps = 2**top
+        h = block / substeps
+        # Number of substeps in the step of every body, and its duration
+        period = 2**(top - levels)
+        dt = h * period
+
+        for substep in range(substeps):
+            starting = np.flatnonzero(substep % period == 0)
+            kick = 0.5 * (a[starting] + external[starting]) * dt[starting, None]
+            system.velocity[starting] += kick
+            system.pos += system.velocity * h
+
+            ending = np.flatnonzero((substep + 1) % period == 0)
+            if len(ending) == len(system):
+                a = simulation.acceleration(system.pos, system.velocity)
+            elif len(ending):
+                a[ending] = simulation.acceleration(system.pos, system.velocity, ending)
+            self.evaluations += len(ending)
+            kick = 0.5 * (a[ending] + external[ending]) * dt[ending, None]
+            system.velocity[ending] += kick
+            self.steps += 1
+
+        self._acceleration = a
+        self._revision = system.revision
+        system.acceleration[:] = 0
+        if simulation.collisions is not None:
+            simulation.collisions.resolve(system)
+        simulation.finish_tick(block)
+
+
+if __name__ == "__main__":
+    import time
+    import scenes
+    import diagnostics
+    from integrators import get_integrator
+
+    parser = argparse.ArgumentParser(description="Compare fixed and adaptive steps on "
+                                                 "the mutual attraction scene")
+    parser.add_argument("--bodies", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--min-distance-sq", type=float, default=1.0,
+                        help="lower clamp of the squared distance of the attraction")
+    parser.add_argument("--eta", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    def scene():
+        simulation = scenes.mutual_attraction(args.bodies, args.seed, distribution="ring",
+                                              min_distance_sq=args.min_distance_sq)
+        simulation.integrator = get_integrator("verlet")
+        return simulation
+
+    print(f"{'mode':<10}{'ticks':>8}{'force evals':>13}{'energy drift':>14}{'time (s)':>10}")
+    for mode in ("fixed", "global", "per_body"):
+        simulation = scene()
+        monitor = diagnostics.Diagnostics().attach(simulation)
+        start = time.perf_counter()
+        if mode == "fixed":
+            ticks = int(round(args.seconds * 240))
+            simulation.run(ticks, 1/240.0)
+            evaluations = (ticks + 1) * len(simulation.system)
+        else:
+            stepper = AdaptiveTimestep(simulation, eta=args.eta,
+                                       per_body=mode == "per_body")
+            stepper.advance(args.seconds)
+            evaluations = stepper.evaluations
+        elapsed = time.perf_counter() - start
+        print(f"{mode:<10}{simulation.tick:>8}{evaluations:>13}"
+              f"{monitor.energy_drift():>14.3e}{elapsed:>10.2f}")
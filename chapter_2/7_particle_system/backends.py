@@ -0,0 +1,104 @@
+"""Selection of the implementation of the hot kernels
+
+The force, boundary and integration kernels have two implementations:
+
+- "numpy": vectorized NumPy, always available
+- "numba": loops compiled by Numba (numba_kernels.py), faster and without
+  temporary arrays, when Numba is installed
+
+The backend is chosen with set_backend(), or with the PARTICLES_BACKEND
+environment variable before the first import. Asking for "numba" without
+Numba installed falls back to "numpy" with a warning.
+
+Pair forces can also be split over several threads, see set_threads() or the
+PARTICLES_THREADS environment variable. Both backends release the GIL in
+their inner loops, so the threads run in parallel.
+"""
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numba_kernels
+except ImportError:
+    numba_kernels = None
+
+BACKENDS = ("numpy", "numba")
+
+_backend = "numpy"
+_threads = 1
+_executor = None
+
+
+def set_backend(name):
+    """Selects the implementation of the kernels
+
+    Args:
+        name (str): "numpy" or "numba"
+
+    Returns:
+        str: The backend actually selected
+    """
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}, expected one of {BACKENDS}")
+    if name == "numba" and numba_kernels is None:
+        warnings.warn("Numba is not installed, using the NumPy kernels", RuntimeWarning)
+        name = "numpy"
+    _backend = name
+    return name
+
+
+def get_backend():
+    """Name of the selected backend
+    """
+    return _backend
+
+
+def compiled():
+    """The compiled kernels module when the "numba" backend is selected, else None
+    """
+    return numba_kernels if _backend == "numba" else None
+
+
+def set_threads(threads):
+    """Sets the number of threads computing the pair forces
+
+    Args:
+        threads (int): Number of threads, 1 computes the forces in the
+                       calling thread. 0 uses one thread per CPU.
+
+    Returns:
+        int: The number of threads
+    """
+    global _threads, _executor
+    if threads == 0:
+        threads = os.cpu_count() or 1
+    if threads < 1:
+        raise ValueError("The number of threads must be positive")
+    if threads != _threads and _executor is not None:
+        _executor.shutdown()
+        _executor = None
+    _threads = threads
+    return threads
+
+
+def get_threads():
+    """Number of threads computing the pair forces
+    """
+    return _threads
+
+
+def executor():
+    """The thread pool of the pair forces, None when running on one thread
+    """
+    global _executor
+    if _threads == 1:
+        return None
+    if _executor is None:
+        _executor = ThreadPoolExecutor(_threads, thread_name_prefix="forces")
+    return _executor
+
+
+set_backend(os.environ.get("PARTICLES_BACKEND", "numpy"))
+set_threads(int(os.environ.get("PARTICLES_THREADS", "1")))
@@ -0,0 +1,263 @@
+import time
+import numpy as np
+from gravity import attract_all
+from spatial_hash import expand_ranges
+
+# Number of target bodies walked through the tree at once. It bounds the
+# size of the (body, node) interaction lists kept in memory.
+TARGET_CHUNK = 4096
+
+
+class QuadTree:
+    """Linear quadtree of a set of bodies for Barnes–Hut force approximation
+
+    The bodies are sorted along a Morton (Z-order) curve, so every node of
+    the tree is a contiguous range of the sorted bodies. Each level of the
+    tree is stored as flat arrays (key, mass, centre of mass, number of
+    bodies and range of children), which allows walking the tree for many
+    bodies at once with numpy.
+
+    Args:
+        pos (numpy.ndarray): Position of the bodies, shape (N, 2)
+        mass (numpy.ndarray): Mass of the bodies, shape (N,)
+        max_depth (int, optional): Maximum number of subdivisions. Bodies that
+                                   are still together at this depth are kept
+                                   in the same leaf.
+    """
+
+    def __init__(self, pos, mass, max_depth=20):
+        if not 0 < max_depth <= 31:
+            raise ValueError("max_depth has to be between 1 and 31")
+        self.pos = np.asarray(pos, dtype=float)
+        self.mass = np.asarray(mass, dtype=float)
+
+        # Square bounding box of all the bodies
+        low = self.pos.min(axis=0)
+        self.size = float((self.pos.max(axis=0) - low).max()) or 1.0
+        self.size *= 1 + 1e-9
+        # Below this squared distance, a centre of mass is the position of a
+        # body up to rounding errors
+        self.coincident_sq = (1e-9 * (np.abs(self.pos).max() + self.size))**2
+
+        cells = 2**max_depth
+        ij = np.floor((self.pos - low) * (cells / self.size)).astype(np.int64)
+        np.clip(ij, 0, cells - 1, out=ij)
+        self.code = _spread_bits(ij[:, 0]) | (_spread_bits(ij[:, 1]) << np.uint64(1))
+        order = np.argsort(self.code, kind="stable")
+        sorted_code = self.code[order]
+        sorted_mass = self.mass[order]
+        sorted_moment = self.pos[order] * sorted_mass[:, None]
+
+        self.max_depth = max_depth
+        self.levels = []
+        for level in range(max_depth + 1):
+            shift = np.uint64(2*(max_depth - level))
+            keys = sorted_code >> shift
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+            node_mass = np.add.reduceat(sorted_mass, starts)
+            com = np.add.reduceat(sorted_moment, starts)
+            np.divide(com, node_mass[:, None], out=com, where=node_mass[:, None] != 0)
+
+            self.levels.append({
+                "key": keys[starts],
+                "mass": node_mass,
+                "com": com,
+                "count": np.diff(np.r_[starts, len(keys)]),
+            })
+            # Stop subdividing once every body has its own leaf
+            if len(starts) == len(keys):
+                break
+        self.depth = len(self.levels) - 1
+
+        # Children of a node are a contiguous range of the next level
+        for parent, child in zip(self.levels[:-1], self.levels[1:]):
+            parent_key = child["key"] >> np.uint64(2)
+            parent["child_start"] = np.searchsorted(parent_key, parent["key"], "left")
+            parent["child_stop"] = np.searchsorted(parent_key, parent["key"], "right")
+
+    def attract(self, G=1, theta=0.5, min_distance_sq=100, max_distance_sq=1000,
+                out=None):
+        """Approximate gravitational force on every body of the tree
+
+        A node is used as a single body placed at its centre of mass when
+        size / distance < theta. Otherwise it is opened and its children are
+        visited. Leaves are always used directly, so theta=0 gives the same
+        forces as the brute force attract_all().
+
+        Args:
+            G (float, optional): Gravitational constant
+            theta (float, optional): Opening angle. Larger values are faster
+                                     but less accurate.
+            min_distance_sq (float, optional): Lower clamp of the squared distance
+            max_distance_sq (float, optional): Upper clamp of the squared distance
+            out (numpy.ndarray, optional): Array of shape (N, 2) to write the forces in
+
+        Returns:
+            numpy.ndarray: Net force on every body, shape (N, 2)
+        """
+        num = len(self.mass)
+        if out is None:
+            out = np.empty((num, 2))
+        for start in range(0, num, TARGET_CHUNK):
+            targets = np.arange(start, min(start + TARGET_CHUNK, num))
+            out[targets] = self._walk(targets, G, theta**2,
+                                      min_distance_sq, max_distance_sq)
+        return out
+
+    def _walk(self, targets, G, theta_sq, min_distance_sq, max_distance_sq):
+        """Walks the tree level by level for a chunk of target bodies
+        """
+        force = np.zeros((len(targets), 2))
+
+        # Interaction list: pairs of (local target index, node index)
+        body = np.arange(len(targets))
+        node = np.zeros(len(targets), dtype=np.int64)
+
+        for level, nodes in enumerate(self.levels):
+            if len(body) == 0:
+                break
+            target = targets[body]
+            node_mass = nodes["mass"][node]
+            com = nodes["com"][node]
+            count = nodes["count"][node]
+
+            shift = np.uint64(2*(self.max_depth - level))
+            contains = (self.code[target] >> shift) == nodes["key"][node]
+
+            # Remove the target itself from the leaves it belongs to. A leaf
+            # holding only the target is left with no mass and adds no force.
+            leaf = (count == 1) | (level == self.depth)
+            own = contains & leaf
+            if own.any():
+                own_mass = self.mass[target[own]]
+                moment = (com[own] * node_mass[own, None]
+                          - self.pos[target[own]] * own_mass[:, None])
+                node_mass[own] -= own_mass
+                com[own] = np.divide(moment, node_mass[own, None],
+                                     out=np.zeros_like(moment),
+                                     where=node_mass[own, None] > 0)
+
+            delta = com - self.pos[target]
+            distance_sq = np.einsum("ij,ij->i", delta, delta)
+            if own.any():
+                # The rest of the leaf sits on the target, as in attract_all()
+                # coincident bodies don't attract each other
+                distance_sq[own & (distance_sq <= self.coincident_sq)] = 0
+
+            size = self.size / 2**level
+            far = ~contains & (size*size < theta_sq*distance_sq)
+            accept = leaf | far
+
+            # Accumulate the force of the accepted nodes
+            a_body = body[accept]
+            a_delta = delta[accept]
+            a_distance_sq = distance_sq[accept]
+            denominator = np.sqrt(a_distance_sq)
+            denominator *= np.clip(a_distance_sq, min_distance_sq, max_distance_sq)
+            scale = np.divide(G * node_mass[accept], denominator,
+                              out=np.zeros_like(denominator), where=denominator > 0)
+            for axis in range(2):
+                force[:, axis] += np.bincount(a_body, weights=a_delta[:, axis]*scale,
+                                              minlength=len(targets))
+
+            # Replace the opened nodes by their children
+            opened = ~accept
+            if not opened.any():
+                break
+            start = nodes["child_start"][node[opened]]
+            count = nodes["child_stop"][node[opened]] - start
+            body = np.repeat(body[opened], count)
+            node = expand_ranges(start, count)
+
+        force *= self.mass[targets, None]
+        return force
+
+
+def barnes_hut_attract(pos, mass, G=1, theta=0.5, min_distance_sq=100,
+                       max_distance_sq=1000, max_depth=20, out=None):
+    """Mutual gravitational force between all bodies in O(N log N)
+
+    Drop-in replacement of gravity.attract_all() using a Barnes–Hut quadtree.
+
+    Args:
+        pos (numpy.ndarray): Position of the bodies, shape (N, 2)
+        mass (numpy.ndarray): Mass of the bodies, shape (N,)
+        G (float, optional): Gravitational constant
+        theta (float, optional): Opening angle of the tree walk
+        min_distance_sq (float, optional): Lower clamp of the squared distance
+        max_distance_sq (float, optional): Upper clamp of the squared distance
+        max_depth (int, optional): Maximum depth of the quadtree
+        out (numpy.ndarray, optional): Array of shape (N, 2) to write the forces in
+
+    Returns:
+        numpy.ndarray: Net force on every body, shape (N, 2)
+    """
+    if len(pos) == 0:
+        # No bounding box to build a tree on, and no force to compute
+        return np.zeros((0, 2)) if out is None else out
+    tree = QuadTree(pos, mass, max_depth=max_depth)
+    return tree.attract(G, theta, min_distance_sq, max_distance_sq, out=out)
+
+
+def report(num_bodies=(1000, 5000, 10000), thetas=(0.3, 0.5, 0.8, 1.0),
+           canvas_size=(600, 600), seed=0):
+    """Compares accuracy and speed of Barnes–Hut against the brute force kernel
+
+    Args:
+        num_bodies (tuple, optional): Number of bodies of every test scene
+        thetas (tuple, optional): Opening angles to test
+        canvas_size (tuple, optional): Bodies are spread uniformly over the canvas
+        seed (int, optional): Seed of the random scenes
+
+    Returns:
+        list: One dict per (num_bodies, theta) with the timings in seconds and
+              the median/maximum relative error of the forces
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for num in num_bodies:
+        pos = rng.uniform((0, 0), canvas_size, (num, 2))
+        mass = rng.integers(10, 25, num).astype(float)
+
+        start = time.perf_counter()
+        exact = attract_all(pos, mass)
+        brute_time = time.perf_counter() - start
+        exact_mag = np.linalg.norm(exact, axis=1)
+
+        for theta in thetas:
+            start = time.perf_counter()
+            approx = barnes_hut_attract(pos, mass, theta=theta)
+            tree_time = time.perf_counter() - start
+
+            error = np.linalg.norm(approx - exact, axis=1) / np.maximum(exact_mag, 1e-12)
+            rows.append({
+                "num_bodies": num,
+                "theta": theta,
+                "brute_force_s": brute_time,
+                "barnes_hut_s": tree_time,
+                "speedup": brute_time / tree_time,
+                "median_error": float(np.median(error)),
+                "max_error": float(error.max()),
+            })
+    return rows
+
+
+def _spread_bits(v):
+    """Inserts a zero bit between the bits of every value (Morton encoding)
+    """
+    v = v.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF),
+                        (4, 0x0F0F0F0F0F0F0F0F), (2, 0x3333333333333333),
+                        (1, 0x5555555555555555)):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+if __name__ == "__main__":
+    print(f"{'bodies':>8} {'theta':>6} {'brute (s)':>10} {'tree (s)':>10} "
+          f"{'speedup':>8} {'median err':>11} {'max err':>9}")
+    for row in report():
+        print(f"{row['num_bodies']:>8} {row['theta']:>6.2f} {row['brute_force_s']:>10.3f} "
+              f"{row['barnes_hut_s']:>10.3f} {row['speedup']:>8.1f} "
+              f"{row['median_error']:>11.2e} {row['max_error']:>9.2e}")
@@ -0,0 +1,360 @@
+"""Benchmarks of the chapter 2 force models, headless
+
+Measures the ticks per second of every scene against the number of bodies,
+and the cost of the building blocks on their own: the force kernels, the
+boundary checks and the handoff of the positions to the renderer. Nothing
+here needs a display.
+
+Results are written as JSON, so two runs can be compared:
+
+    python benchmarks.py --output before.json
+    (change the code)
+    python benchmarks.py --output after.json --compare before.json
+"""
+import argparse
+import ctypes
+from collections import deque
+import datetime
+import json
+import os
+import platform
+import time
+import numpy as np
+import scenes
+from scenarios import uniform
+from forces import Friction, Drag, Attractor, ForceRegistry, Weight, Wind
+from gravity import attract_all
+from barnes_hut import barnes_hut_attract
+from boundaries import Boundary
+from timestep import FixedTimestep
+from rendering import SoftwareRenderer
+from backends import BACKENDS, get_backend, get_threads, set_backend, set_threads
+
+NUM_BODIES = (10, 100, 1000, 10000)
+
+# The all-pairs scene is quadratic, don't run it past this many bodies
+MAX_PAIRWISE_BODIES = 5000
+
+
+def measure(function, min_time=0.2, repeat=5):
+    """Times a function, calling it in batches long enough for the clock
+
+    Args:
+        function (callable): Function without arguments
+        min_time (float, optional): Minimum duration of a batch in seconds
+        repeat (int, optional): Number of batches
+
+    Returns:
+        dict: "seconds", the median duration of a call, "best", the fastest
+              batch, and "calls", the number of calls per batch
+    """
+    function()
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        calls *= 2 if elapsed == 0 else max(2, int(min_time / elapsed * 1.2))
+
+    timings = [elapsed / calls]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        timings.append((time.perf_counter() - start) / calls)
+    return {"seconds": float(np.median(timings)), "best": min(timings), "calls": calls}
+
+
+def bench_scenes(num_bodies=NUM_BODIES, ticks=10, seed=0, min_time=0.2):
+    """Ticks per second of every scene of scenes.SCENES
+
+    Args:
+        num_bodies (tuple, optional): Numbers of bodies to test
+        ticks (int, optional): Number of ticks per timed call
+        seed (int, optional): Seed of the scenes
+        min_time (float, optional): See measure()
+
+    Returns:
+        list: One result dict per (scene, number of bodies)
+    """
+    results = []
+    for name, scene in scenes.SCENES.items():
+        for num in num_bodies:
+            if name == "mutual_attraction" and num > MAX_PAIRWISE_BODIES:
+                continue
+            simulation = scene(num=num, seed=seed)
+            timing = measure(lambda: simulation.run(ticks), min_time)
+            results.append(_result("scene", name, num, timing,
+                                   ticks_per_second=ticks / timing["seconds"]))
+    return results
+
+
+def bench_forces(num_bodies=NUM_BODIES, seed=0, min_time=0.2):
+    """Force kernels on their own, evaluated once for all bodies
+
+    Args:
+        num_bodies (tuple, optional): Numbers of bodies to test
+        seed (int, optional): Seed of the bodies
+        min_time (float, optional): See measure()
+
+    Returns:
+        list: One result dict per (kernel, number of bodies)
+    """
+    results = []
+    for num in num_bodies:
+        system = uniform(num, seed, velocity_range=(-5, 5))
+        # Half of the bodies on the floor, so friction has work to do
+        system.pos[::2, 1] = system.radius[::2]
+        pos, velocity = system.pos, system.velocity
+
+        kernels = {
+            "friction": Friction(mu=0.2),
+            "drag": Drag(c=0.003),
+            "attractor": Attractor(pos=(300, 300), mass=500, G=1),
+            "uniform_fields": ForceRegistry([Weight((0, -10)), Wind((4, 0))]),
+        }
+        if num <= MAX_PAIRWISE_BODIES:
+            kernels["attract_all"] = lambda s, p, v: attract_all(p, s.mass)
+        kernels["barnes_hut"] = lambda s, p, v: barnes_hut_attract(p, s.mass, theta=0.5)
+
+        for name, kernel in kernels.items():
+            if isinstance(kernel, ForceRegistry):
+                function = lambda: kernel.evaluate(system, pos, velocity)
+            else:
+                function = lambda: kernel(system, pos, velocity)
+            timing = measure(function, min_time)
+            results.append(_result("force", name, num, timing))
+    return results
+
+
+def bench_boundaries(num_bodies=NUM_BODIES, seed=0, min_time=0.2):
+    """Boundary checks, the vectorized check_edges()
+
+    A tenth of the bodies are outside the canvas, moving outwards. Bounce and
+    wrap bring them back inside, so the measure mostly covers finding the
+    bodies to fix. Absorb removes bodies and is timed on a fresh copy per call.
+
+    Args:
+        num_bodies (tuple, optional): Numbers of bodies to test
+        seed (int, optional): Seed of the bodies
+        min_time (float, optional): See measure()
+
+    Returns:
+        list: One result dict per (mode, number of bodies)
+    """
+    results = []
+    for num in num_bodies:
+        system = _escaping(num, seed)
+        for mode in Boundary.MODES:
+            boundary = Boundary(mode)
+            if mode == "absorb":
+                function = lambda: boundary.apply(_escaping(num, seed))
+                setup = measure(lambda: _escaping(num, seed), min_time)
+            else:
+                function = lambda: boundary.apply(system)
+                setup = None
+            timing = measure(function, min_time)
+            if setup is not None:
+                timing["seconds"] = max(timing["seconds"] - setup["seconds"], 0.0)
+            results.append(_result("boundary", mode, num, timing))
+    return results
+
+
+def bench_rendering(num_bodies=NUM_BODIES, seed=0, min_time=0.2):
+    """Handoff of the positions to the renderer
+
+    "interpolate" blends the last two physics states (FixedTimestep),
+    "vertex_copy" copies the positions into a float32 ctypes array, like
+    PointRenderer.update() into its vertex buffer, and "software_draw"
+    rasterizes the bodies with SoftwareRenderer.
+
+    Args:
+        num_bodies (tuple, optional): Numbers of bodies to test
+        seed (int, optional): Seed of the bodies
+        min_time (float, optional): See measure()
+
+    Returns:
+        list: One result dict per (stage, number of bodies)
+    """
+    results = []
+    for num in num_bodies:
+        simulation = scenes.gravitational_attraction(num, seed, canvas_size=(600, 600))
+        loop = FixedTimestep(simulation)
+        loop.advance(1.5 * loop.step)
+        out = np.empty_like(simulation.system.pos)
+
+        vertices = (ctypes.c_float * (2 * num))()
+        buffer = np.ctypeslib.as_array(vertices)
+        renderer = SoftwareRenderer(simulation.system)
+
+        def vertex_copy():
+            buffer[:] = np.ravel(out)
+
+        stages = {
+            "interpolate": lambda: loop.interpolated_pos(out),
+            "vertex_copy": vertex_copy,
+            "software_draw": lambda: renderer.draw(),
+        }
+        for name, function in stages.items():
+            results.append(_result("rendering", name, num, measure(function, min_time)))
+    return results
+
+
+def bench_lifecycle(num_bodies=NUM_BODIES, seed=0, min_time=0.2):
+    """Spawning and despawning bodies in a system of constant population
+
+    Every call spawns a batch of a hundredth of the bodies (at least one)
+    and despawns the oldest batch, like an Emitter with a lifetime. The
+    storage of the system is never reallocated.
+
+    Args:
+        num_bodies (tuple, optional): Numbers of bodies to test
+        seed (int, optional): Seed of the bodies
+        min_time (float, optional): See measure()
+
+    Returns:
+        list: One result dict per number of bodies
+    """
+    results = []
+    for num in num_bodies:
+        system = uniform(num, seed)
+        system.reserve(2 * num)
+        batch = max(1, num // 100)
+        batches = deque(system.handles()[i:i + batch] for i in range(0, num, batch))
+        mass, pos = system.mass[:batch].copy(), system.pos[:batch].copy()
+
+        def churn():
+            batches.append(system.spawn(mass, pos))
+            system.despawn(batches.popleft())
+
+        timing = measure(churn, min_time)
+        results.append(_result("lifecycle", "spawn_despawn", num, timing,
+                               bodies_per_second=batch / timing["seconds"]))
+    return results
+
+
+GROUPS = {
+    "scene": bench_scenes,
+    "force": bench_forces,
+    "boundary": bench_boundaries,
+    "rendering": bench_rendering,
+    "lifecycle": bench_lifecycle,
+}
+
+
+def run(groups=tuple(GROUPS), num_bodies=NUM_BODIES, seed=0, min_time=0.2):
+    """Runs benchmark groups
+
+    Args:
+        groups (tuple, optional): Names of the groups to run, see GROUPS
+        num_bodies (tuple, optional): Numbers of bodies to test
+        seed (int, optional): Seed of the bodies
+        min_time (float, optional): See measure()
+
+    Returns:
+        dict: "environment", describing the machine, and "results"
+    """
+    results = []
+    for group in groups:
+        results += GROUPS[group](num_bodies=num_bodies, seed=seed, min_time=min_time)
+    return {"environment": environment(), "results": results}
+
+
+def environment():
+    """Description of the machine and library versions, saved with the results
+    """
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "backend": get_backend(),
+        "threads": get_threads(),
+    }
+
+
+def compare(baseline, current):
+    """Matches the results of two runs and computes the ratio of their timings
+
+    Args:
+        baseline (dict): Output of run(), e.g. loaded from JSON
+        current (dict): Output of run()
+
+    Returns:
+        list: One dict per benchmark present in both runs, with "speedup" > 1
+              when current is faster
+    """
+    before = {_key(result): result for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        old = before.get(_key(result))
+        if old is not None:
+            rows.append({"group": result["group"], "name": result["name"],
+                         "num_bodies": result["num_bodies"],
+                         "before_s": old["seconds"], "after_s": result["seconds"],
+                         "speedup": old["seconds"] / max(result["seconds"], 1e-12)})
+    return rows
+
+
+def _escaping(num, seed):
+    """Bodies spread over the canvas, a tenth of them beyond its left edge
+    """
+    system = uniform(num, seed, velocity_range=(-5, 5))
+    system.pos[::10, 0] = -10
+    system.velocity[::10, 0] = -5
+    return system
+
+
+def _result(group, name, num_bodies, timing, **extra):
+    return {"group": group, "name": name, "num_bodies": num_bodies, **timing, **extra}
+
+
+def _key(result):
+    return result["group"], result["name"], result["num_bodies"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the chapter 2 force models")
+    parser.add_argument("--output", default="benchmarks.json")
+    parser.add_argument("--groups", nargs="+", choices=sorted(GROUPS), default=list(GROUPS))
+    parser.add_argument("--bodies", type=int, nargs="+", default=list(NUM_BODIES))
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="minimum duration of a timed batch in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", default=None, help="JSON file of a previous run")
+    parser.add_argument("--backend", choices=BACKENDS, default=None,
+                        help="implementation of the kernels, see backends.py")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="threads computing the pair forces, 0 for one per CPU")
+    args = parser.parse_args()
+
+    if args.backend is not None:
+        set_backend(args.backend)
+    if args.threads is not None:
+        set_threads(args.threads)
+
+    report = run(args.groups, tuple(args.bodies), args.seed, args.min_time)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    for result in report["results"]:
+        line = (f"{result['group']:>9} {result['name']:<25} {result['num_bodies']:>7} "
+                f"{result['seconds'] * 1e3:>10.3f} ms")
+        if "ticks_per_second" in result:
+            line += f" {result['ticks_per_second']:>10.1f} ticks/s"
+        if "bodies_per_second" in result:
+            line += f" {result['bodies_per_second']:>10.0f} bodies/s"
+        print(line)
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print()
+        for row in compare(baseline, report):
+            print(f"{row['group']:>9} {row['name']:<25} {row['num_bodies']:>7} "
+                  f"{row['speedup']:>6.2f}x")
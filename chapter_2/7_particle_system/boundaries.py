@@ -0,0 +1,84 @@
+import numpy as np
+from backends import compiled
+
+
+class Boundary:
+    """What happens to the bodies reaching the edges of the canvas
+
+    All bodies are handled at once, for any canvas width and height.
+
+    Modes:
+        "bounce": the body is put back inside the canvas and the velocity
+                  component pointing out of it is reversed and scaled by the
+                  restitution.
+        "wrap": the canvas is periodic, a body leaving on one side comes back
+                on the opposite side with the same velocity.
+        "absorb": bodies touching an edge are removed from the system, with
+                  ParticleSystem.despawn(): the last bodies take their rows.
+
+    Args:
+        mode (str, optional): One of "bounce", "wrap" and "absorb"
+        restitution (float, optional): Fraction of the speed kept by a bounce
+    """
+
+    MODES = ("bounce", "wrap", "absorb")
+
+    def __init__(self, mode="bounce", restitution=1.0):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown boundary mode {mode!r}, expected one of {self.MODES}")
+        self.mode = mode
+        self.restitution = restitution
+
+    def apply(self, system):
+        """Applies the boundary to every body of the system
+
+        Args:
+            system (ParticleSystem): The bodies to keep in the canvas
+
+        Returns:
+            int: Number of bodies that reached an edge
+        """
+        return getattr(self, "_" + self.mode)(system)
+
+    def _bounce(self, system):
+        pos, velocity, radius = system.pos, system.velocity, system.radius
+        kernels = compiled()
+        if kernels is not None:
+            return kernels.bounce(pos, velocity, radius, float(system.canvas_w),
+                                  float(system.canvas_h), float(self.restitution))
+        hits = np.zeros(len(system), dtype=bool)
+        for axis, size in enumerate((system.canvas_w, system.canvas_h)):
+            low = pos[:, axis] <= radius
+            high = pos[:, axis] >= size - radius
+            np.clip(pos[:, axis], radius, size - radius, out=pos[:, axis])
+
+            outwards = (low & (velocity[:, axis] < 0)) | (high & (velocity[:, axis] > 0))
+            velocity[outwards, axis] *= -self.restitution
+            hits |= low | high
+        return int(hits.sum())
+
+    def _wrap(self, system):
+        pos = system.pos
+        size = np.array([system.canvas_w, system.canvas_h], dtype=float)
+        outside = ((pos < 0) | (pos >= size)).any(axis=1)
+        np.mod(pos, size, out=pos)
+        return int(outside.sum())
+
+    def _absorb(self, system):
+        pos, radius = system.pos, system.radius
+        size = np.array([system.canvas_w, system.canvas_h], dtype=float)
+        touching = ((pos <= radius[:, None]) | (pos >= size - radius[:, None])).any(axis=1)
+        if touching.any():
+            system.despawn(system.handles(touching))
+        return int(touching.sum())
+
+
+def get_boundary(boundary):
+    """Returns a Boundary from a mode name, or None for no boundary
+
+    Args:
+        boundary (str, Boundary or None): A mode of Boundary, or a Boundary instance
+    """
+    if boundary is None or isinstance(boundary, Boundary):
+        return boundary
+    return Boundary(boundary)
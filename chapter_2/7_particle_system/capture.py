@@ -0,0 +1,242 @@
+import argparse
+import os
+import queue
+import struct
+import subprocess
+import sys
+import threading
+import zlib
+import numpy as np
+from rendering import SoftwareRenderer
+
+
+class FrameWriter:
+    """Encodes frames in a worker thread while the simulation keeps running
+
+    write() hands a copy of the frame to a bounded queue and returns
+    straight away. A worker thread encodes and stores the frames in order.
+    When the encoder falls behind and the queue is full, write() waits, so
+    memory stays bounded.
+
+    Subclasses implement encode(index, frame). Use as a context manager, or
+    call close() to flush the remaining frames.
+
+    Args:
+        max_pending (int, optional): Number of frames waiting to be encoded
+                                     before write() blocks
+    """
+
+    def __init__(self, max_pending=16):
+        self.frames = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, frame):
+        """Queues a frame for encoding
+
+        Args:
+            frame (numpy.ndarray): RGB image of shape (height, width, 3), uint8
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put((self.frames, np.array(frame, dtype=np.uint8)))
+        self.frames += 1
+
+    def close(self):
+        """Waits for all queued frames to be encoded
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self.finish()
+        if self._error is not None:
+            raise self._error
+
+    def encode(self, index, frame):
+        raise NotImplementedError
+
+    def finish(self):
+        """Called once all frames are encoded
+        """
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is None:
+                try:
+                    self.encode(*item)
+                except Exception as error:
+                    self._error = error
+
+
+class PngSequenceWriter(FrameWriter):
+    """Saves every frame as a numbered PNG file
+
+    The PNG files are written with zlib only, no imaging library is needed.
+
+    Args:
+        directory (str): Folder of the images, created if missing
+        pattern (str, optional): File name of a frame, formatted with its index
+        compression (int, optional): zlib compression level, 0 to 9
+        max_pending (int, optional): See FrameWriter
+    """
+
+    def __init__(self, directory, pattern="frame_{:06d}.png", compression=6,
+                 max_pending=16):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.pattern = pattern
+        self.compression = compression
+        super().__init__(max_pending)
+
+    def encode(self, index, frame):
+        path = os.path.join(self.directory, self.pattern.format(index))
+        with open(path, "wb") as file:
+            file.write(encode_png(frame, self.compression))
+
+
+class RawVideoWriter(FrameWriter):
+    """Streams the frames as raw RGB24 bytes, e.g. to the stdin of ffmpeg
+
+    Args:
+        stream (file): Binary file object to write to
+        max_pending (int, optional): See FrameWriter
+        process (subprocess.Popen, optional): Process reading the stream,
+                                              waited for on close()
+        close_stream (bool, optional): Close the stream on close()
+    """
+
+    def __init__(self, stream, max_pending=16, process=None, close_stream=False):
+        self.stream = stream
+        self.process = process
+        self.close_stream = close_stream or process is not None
+        super().__init__(max_pending)
+
+    @classmethod
+    def to_ffmpeg(cls, path, size, fps=60, max_pending=16):
+        """Pipes the frames to ffmpeg, which encodes them into a video file
+
+        Args:
+            path (str): Output video, e.g. "scene.mp4"
+            size (tuple): Width and height of the frames
+            fps (int, optional): Frame rate of the video
+            max_pending (int, optional): See FrameWriter
+        """
+        width, height = size
+        command = ["ffmpeg", "-loglevel", "error", "-y",
+                   "-f", "rawvideo", "-pix_fmt", "rgb24",
+                   "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+                   "-pix_fmt", "yuv420p", path]
+        process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        return cls(process.stdin, max_pending, process)
+
+    def encode(self, index, frame):
+        self.stream.write(frame.tobytes())
+
+    def finish(self):
+        self.stream.flush()
+        if self.close_stream:
+            self.stream.close()
+        if self.process is not None:
+            self.process.wait()
+
+
+def encode_png(image, compression=6):
+    """Encodes an RGB image as PNG
+
+    Args:
+        image (numpy.ndarray): RGB image of shape (height, width, 3), uint8
+        compression (int, optional): zlib compression level, 0 to 9
+
+    Returns:
+        bytes: The PNG file
+    """
+    height, width = image.shape[:2]
+
+    # Every row starts with the filter type, 0 (no filter)
+    rows = np.zeros((height, width*3 + 1), dtype=np.uint8)
+    rows[:, 1:] = image.reshape(height, width*3)
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data
+                + struct.pack(">I", zlib.crc32(kind + data)))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(rows.tobytes(), compression))
+            + chunk(b"IEND", b""))
+
+
+def record(simulation, writer, frames, ticks_per_frame=4, dt=1/240.0, trail=None,
+           renderer=None):
+    """Renders a simulation offscreen, one frame every few ticks
+
+    Args:
+        simulation (Simulation): The simulation to record
+        writer (FrameWriter): Where to send the frames
+        frames (int): Number of frames to record
+        ticks_per_frame (int, optional): Simulation ticks between two frames
+        dt (float, optional): Duration of a tick in seconds
+        trail (float, optional): Opacity (0 to 1) of the background drawn over
+                                 the previous frame, like the translucent
+                                 Rectangle of 6_mutual_attraction. None clears
+                                 every frame.
+        renderer (SoftwareRenderer, optional): Rasterizer to use
+    """
+    if renderer is None:
+        renderer = SoftwareRenderer(simulation.system)
+    for _ in range(frames):
+        simulation.run(ticks_per_frame, dt)
+        if trail is None:
+            renderer.clear()
+        else:
+            renderer.fade(trail)
+        renderer.update()
+        writer.write(renderer.draw(clear=False))
+
+
+if __name__ == "__main__":
+    import scenes
+
+    parser = argparse.ArgumentParser(description="Record a chapter 2 scene without a window")
+    parser.add_argument("scene", choices=sorted(scenes.SCENES))
+    parser.add_argument("output", help="folder of the PNG frames, video file for "
+                                       "--format ffmpeg, or - for raw RGB on stdout")
+    parser.add_argument("--format", choices=("png", "ffmpeg", "raw"), default="png")
+    parser.add_argument("--bodies", type=int, default=None)
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--ticks-per-frame", type=int, default=4)
+    parser.add_argument("--trail", type=float, default=None,
+                        help="background opacity drawn over the previous frame, e.g. 0.2")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    kwargs = {"seed": args.seed}
+    if args.bodies is not None:
+        kwargs["num"] = args.bodies
+    simulation = scenes.SCENES[args.scene](**kwargs)
+    size = (simulation.system.canvas_w, simulation.system.canvas_h)
+    dt = 1 / (args.fps * args.ticks_per_frame)
+
+    if args.format == "png":
+        writer = PngSequenceWriter(args.output)
+    elif args.format == "ffmpeg":
+        writer = RawVideoWriter.to_ffmpeg(args.output, size, args.fps)
+    elif args.output == "-":
+        writer = RawVideoWriter(sys.stdout.buffer)
+    else:
+        writer = RawVideoWriter(open(args.output, "wb"), close_stream=True)
+
+    with writer:
+        record(simulation, writer, args.frames, args.ticks_per_frame, dt, args.trail)
@@ -0,0 +1,91 @@
+import numpy as np
+from spatial_hash import SpatialHash
+
+
+class Collisions:
+    """Collisions between the bodies of a particle system
+
+    Broadphase: the bodies are bucketed in a spatial hash whose cells are as
+    wide as the largest body (twice the largest radius, see
+    ParticleSystem.radius), so only bodies in neighbouring cells are tested.
+
+    Narrowphase: every overlapping pair of circles is pushed apart along
+    the line joining their centres, in proportion to the mass of the other
+    body, and approaching pairs exchange an impulse. All pairs are resolved
+    at once with numpy.
+
+    Args:
+        restitution (float, optional): 1 for elastic collisions, 0 for bodies
+                                       that stop along the collision normal
+        iterations (int, optional): Number of resolution passes per tick.
+                                    More passes settle dense piles better.
+    """
+
+    def __init__(self, restitution=1.0, iterations=1):
+        self.restitution = restitution
+        self.iterations = iterations
+        self.contacts = 0
+
+    def resolve(self, system):
+        """Separates the overlapping bodies and updates their velocities
+
+        Args:
+            system (ParticleSystem): The bodies to collide
+
+        Returns:
+            int: Number of overlapping pairs found in the last pass
+        """
+        if len(system) < 2:
+            self.contacts = 0
+            return 0
+        grid = SpatialHash(cell_size=2 * system.radius.max())
+        for _ in range(self.iterations):
+            self.contacts = self._resolve_once(system, grid)
+            if not self.contacts:
+                break
+        return self.contacts
+
+    def _resolve_once(self, system, grid):
+        pos, velocity = system.pos, system.velocity
+        mass, radius = system.mass, system.radius
+
+        i, j = grid.build(pos).candidate_pairs()
+        delta = pos[j] - pos[i]
+        distance = np.hypot(delta[:, 0], delta[:, 1])
+        overlap = radius[i] + radius[j] - distance
+        hit = overlap > 0
+        if not hit.any():
+            return 0
+        i, j, delta, distance, overlap = i[hit], j[hit], delta[hit], distance[hit], overlap[hit]
+
+        # Collision normal, from i to j. Bodies at the same spot are split along x
+        normal = np.zeros_like(delta)
+        normal[:, 0] = 1
+        apart = distance > 0
+        normal[apart] = delta[apart] / distance[apart, None]
+
+        # Push the bodies apart, the lighter one moving the most
+        total_mass = mass[i] + mass[j]
+        push = normal * overlap[:, None]
+        correction = np.zeros_like(pos)
+        _add_rows(correction, i, -push * (mass[j] / total_mass)[:, None])
+        _add_rows(correction, j, push * (mass[i] / total_mass)[:, None])
+        pos += correction
+
+        # Exchange an impulse between the pairs moving towards each other
+        closing = np.einsum("ij,ij->i", velocity[j] - velocity[i], normal)
+        approaching = closing < 0
+        impulse = -(1 + self.restitution) * closing / (1/mass[i] + 1/mass[j])
+        impulse = normal * (impulse * approaching)[:, None]
+        change = np.zeros_like(velocity)
+        _add_rows(change, i, -impulse / mass[i, None])
+        _add_rows(change, j, impulse / mass[j, None])
+        velocity += change
+        return len(i)
+
+
+def _add_rows(out, index, values):
+    """Adds values[k] to out[index[k]], accumulating repeated indices
+    """
+    for axis in range(out.shape[1]):
+        out[:, axis] += np.bincount(index, weights=values[:, axis], minlength=len(out))
@@ -0,0 +1,324 @@
+"""Physics checks: conserved quantities and comparison with the original Mover code
+
+Diagnostics is an observer recording the kinetic and potential energy and
+the linear and angular momentum of a simulation, all as reductions over the
+arrays of the bodies. With only gravitational and uniform forces and no
+boundary, the total energy and the momenta should stay (nearly) constant;
+a drift after changing a kernel or an integrator shows a bug.
+
+compare_to_reference() runs a gravitational scene both with the engine and
+with a line by line port of Mover.attract() on pyglet Vec2, and reports how
+far the trajectories diverge.
+"""
+import argparse
+import inspect
+import numpy as np
+from gravity import potential
+from forces import UniformField, Attraction, Attractor, Attractors
+
+try:
+    from pyglet.math import Vec2
+except Exception:
+    Vec2 = None
+
+
+def kinetic_energy(system):
+    """Total kinetic energy, sum of m*v**2/2
+
+    Args:
+        system (ParticleSystem): The bodies
+
+    Returns:
+        float: The kinetic energy
+    """
+    speed_sq = np.einsum("ij,ij->i", system.velocity, system.velocity)
+    return 0.5 * float(system.mass @ speed_sq)
+
+
+def linear_momentum(system):
+    """Total momentum, sum of m*v
+
+    Args:
+        system (ParticleSystem): The bodies
+
+    Returns:
+        numpy.ndarray: The momentum, shape (2,)
+    """
+    return system.mass @ system.velocity
+
+
+def angular_momentum(system, origin=(0, 0)):
+    """Total angular momentum around a point, sum of m * (r x v)
+
+    Args:
+        system (ParticleSystem): The bodies
+        origin (tuple, optional): The point
+
+    Returns:
+        float: The angular momentum, counterclockwise positive
+    """
+    r = system.pos - np.asarray(origin, dtype=float)
+    cross = r[:, 0] * system.velocity[:, 1] - r[:, 1] * system.velocity[:, 0]
+    return float(system.mass @ cross)
+
+
+def potential_energy(simulation, dt=1/240.0):
+    """Potential energy of the conservative forces of a simulation
+
+    Counts the enabled Attraction, Attractor(s) and UniformField forces without
+    region. Friction, drag and forces restricted to a region have no
+    potential and are left out.
+
+    With the "legacy" integrator a force is applied in full every tick
+    (velocity += force / mass), i.e. it acts as force / dt, so the potential
+    is divided by dt to be comparable with the kinetic energy.
+
+    Args:
+        simulation (Simulation): The simulation
+        dt (float, optional): Duration of a tick, only used by "legacy"
+
+    Returns:
+        float: The potential energy
+    """
+    system = simulation.system
+    energy = 0.0
+    for force in simulation.forces:
+        if not force.enabled or force.region is not None:
+            continue
+        if isinstance(force, Attraction):
+            energy += 0.5 * potential(system.pos, system.mass, system.pos, system.mass,
+                                      force.G, force.min_distance_sq,
+                                      force.max_distance_sq).sum()
+        elif isinstance(force, (Attractor, Attractors)):
+            energy += potential(system.pos, system.mass, force.pos, force.mass, force.G,
+                                force.min_distance_sq, force.max_distance_sq).sum()
+        elif isinstance(force, UniformField):
+            field = force(system, system.pos, system.velocity)
+            energy -= float(np.sum(field * system.pos))
+    if simulation.integrator.name == "legacy":
+        energy /= dt
+    return float(energy)
+
+
+def measure(simulation, dt=1/240.0, origin=(0, 0)):
+    """All the diagnostics of the current state of a simulation
+
+    Args:
+        simulation (Simulation): The simulation
+        dt (float, optional): Duration of a tick, see potential_energy()
+        origin (tuple, optional): Point of the angular momentum
+
+    Returns:
+        dict: tick, kinetic, potential and total energy, momentum (2 values)
+              and angular momentum
+    """
+    kinetic = kinetic_energy(simulation.system)
+    potential = potential_energy(simulation, dt)
+    return {
+        "tick": simulation.tick,
+        "kinetic": kinetic,
+        "potential": potential,
+        "energy": kinetic + potential,
+        "momentum": linear_momentum(simulation.system).tolist(),
+        "angular_momentum": angular_momentum(simulation.system, origin),
+    }
+
+
+class Diagnostics:
+    """Observer recording the conserved quantities of a simulation
+
+    Example:
+        diagnostics = Diagnostics(dt=1/240.0).attach(simulation, every=10)
+        simulation.run(2400)
+        print(diagnostics.energy_drift())
+
+    Args:
+        dt (float, optional): Duration of a tick, see potential_energy()
+        origin (tuple, optional): Point of the angular momentum
+    """
+
+    def __init__(self, dt=1/240.0, origin=(0, 0)):
+        self.dt = dt
+        self.origin = origin
+        self.records = []
+
+    def __call__(self, simulation):
+        self.records.append(measure(simulation, self.dt, self.origin))
+
+    def attach(self, simulation, every=1):
+        """Records the initial state, then every few ticks of the simulation
+
+        Returns:
+            Diagnostics: self
+        """
+        self(simulation)
+        simulation.add_observer(self, every)
+        return self
+
+    def history(self):
+        """The records as arrays, one entry per record
+
+        Returns:
+            dict: Same keys as measure(), "momentum" of shape (records, 2)
+        """
+        return {key: np.array([record[key] for record in self.records])
+                for key in self.records[0]} if self.records else {}
+
+    def energy_drift(self):
+        """Largest change of the total energy, relative to its initial value
+
+        Returns:
+            float: max |E(t) - E(0)| / |E(0)|
+        """
+        energy = self.history()["energy"]
+        return float(np.abs(energy - energy[0]).max() / max(abs(energy[0]), 1e-300))
+
+
+class ReferenceMover:
+    """Line by line port of the Mover of chapter 2, without the pyglet shape
+
+    Args:
+        x (float): Position on the x axis
+        y (float): Position on the y axis
+        mass (float): Mass of the mover
+        velocity (tuple, optional): Initial velocity
+    """
+
+    def __init__(self, x, y, mass, velocity=(0, 0)):
+        self.mass = mass
+        self.pos = Vec2(float(x), float(y))
+        self.velocity = Vec2(*velocity)
+        self.acceleration = Vec2(0, 0)
+
+    def apply_force(self, force):
+        f = force / self.mass
+        self.acceleration = self.acceleration + f
+
+    def attract(self, other, G=1, min_distance_sq=100, max_distance_sq=1000):
+        force = self.pos - other.pos
+        distance_sq = min(max_distance_sq, max(min_distance_sq, force.mag**2))
+        strength = G*(self.mass*other.mass)/distance_sq
+        force = force.from_magnitude(strength)
+        other.apply_force(force)
+
+    def update(self, dt):
+        self.velocity = self.velocity + self.acceleration
+        self.pos = self.pos + self.velocity * dt
+        self.acceleration = Vec2(0, 0)
+
+
+def compare_to_reference(simulation, ticks=240, dt=1/240.0, rtol=1e-9, atol=1e-6):
+    """Runs a gravitational simulation next to the per object reference
+
+    Every tick, every Attractor attracts every mover and every mover
+    attracts every other one with ReferenceMover.attract(), then all movers
+    update. This is the loop of 6_mutual_attraction with the forces of a tick
+    all computed from the same positions, which is what the engine does.
+
+    Only Attraction and Attractor(s) forces, the "legacy" integrator and no
+    boundary are supported, as in the chapter 2.5 and 2.6 scripts.
+
+    Args:
+        simulation (Simulation): The simulation to check, advanced by ticks
+        ticks (int, optional): Number of ticks to compare
+        dt (float, optional): Duration of a tick
+        rtol (float, optional): Relative tolerance of the positions
+        atol (float, optional): Absolute tolerance of the positions, in pixels
+
+    Returns:
+        dict: "passed", "max_position_error", "max_velocity_error" (in
+              pixels and pixels per second, over all ticks and bodies),
+              "first_failure" (tick or None) and "position_error", the
+              largest position error of every tick
+    """
+    if Vec2 is None:
+        raise RuntimeError("The reference implementation needs pyglet")
+    if simulation.boundary is not None or simulation.integrator.name != "legacy":
+        raise ValueError("The reference only supports the legacy integrator without boundary")
+    forces = [force for force in simulation.forces if force.enabled]
+    if any(not isinstance(force, (Attraction, Attractor, Attractors)) for force in forces):
+        raise ValueError("The reference only supports Attraction and Attractor(s) forces")
+
+    system = simulation.system
+    movers = [ReferenceMover(x, y, m, v)
+              for (x, y), m, v in zip(system.pos.tolist(), system.mass.tolist(),
+                                      system.velocity.tolist())]
+    attractors = [(ReferenceMover(*force.pos, force.mass), force) for force in forces
+                  if isinstance(force, Attractor)]
+    attractors += [(ReferenceMover(x, y, m), force) for force in forces
+                   if isinstance(force, Attractors)
+                   for (x, y), m in zip(force.pos.tolist(), force.mass.tolist())]
+    mutual = [force for force in forces if isinstance(force, Attraction)]
+
+    position_error = np.empty(ticks)
+    max_velocity_error = 0.0
+    first_failure = None
+    for tick in range(ticks):
+        for mover in movers:
+            for attractor, force in attractors:
+                attractor.attract(mover, force.G, force.min_distance_sq,
+                                  force.max_distance_sq)
+            for force in mutual:
+                for other in movers:
+                    if other is not mover:
+                        mover.attract(other, force.G, force.min_distance_sq,
+                                      force.max_distance_sq)
+        for mover in movers:
+            mover.update(dt)
+        simulation.step(dt)
+
+        reference_pos = np.array([(mover.pos.x, mover.pos.y) for mover in movers])
+        reference_velocity = np.array([(mover.velocity.x, mover.velocity.y)
+                                       for mover in movers])
+        error = np.abs(system.pos - reference_pos)
+        position_error[tick] = error.max(initial=0)
+        max_velocity_error = max(max_velocity_error,
+                                 np.abs(system.velocity - reference_velocity).max(initial=0))
+        if first_failure is None and not np.all(error <= atol + rtol*np.abs(reference_pos)):
+            first_failure = simulation.tick
+
+    return {
+        "passed": first_failure is None,
+        "max_position_error": float(position_error.max(initial=0)),
+        "max_velocity_error": float(max_velocity_error),
+        "first_failure": first_failure,
+        "position_error": position_error,
+    }
+
+
+if __name__ == "__main__":
+    import scenes
+
+    parser = argparse.ArgumentParser(description="Check an attraction scene against "
+                                                 "the reference Mover.attract()")
+    parser.add_argument("scene", nargs="?", default="mutual_attraction",
+                        choices=("gravitational_attraction", "mutual_attraction",
+                                 "attractor_field"))
+    parser.add_argument("--bodies", type=int, default=20)
+    parser.add_argument("--ticks", type=int, default=240)
+    parser.add_argument("--theta", type=float, default=None,
+                        help="check the Barnes–Hut forces instead of the exact ones")
+    parser.add_argument("--atol", type=float, default=1e-6)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    kwargs = {"num": args.bodies, "seed": args.seed}
+    if args.theta is not None:
+        if "theta" not in inspect.signature(scenes.SCENES[args.scene]).parameters:
+            parser.error(f"--theta is not supported by the {args.scene} scene")
+        kwargs["theta"] = args.theta
+    if args.scene == "attractor_field":
+        # The reference computes the exact field, without the grid
+        kwargs["grid_cell"] = None
+    simulation = scenes.SCENES[args.scene](**kwargs)
+    # The reference has no boundary, e.g. the wrapping edges of attractor_field
+    simulation.boundary = None
+
+    diagnostics = Diagnostics().attach(simulation)
+    result = compare_to_reference(simulation, args.ticks, atol=args.atol)
+    history = diagnostics.history()
+    print(f"{'passed' if result['passed'] else 'FAILED'}: max position error "
+          f"{result['max_position_error']:.3e} px, max velocity error "
+          f"{result['max_velocity_error']:.3e} px/s over {args.ticks} ticks")
+    print(f"energy drift {diagnostics.energy_drift():.3e}, momentum "
+          f"{history['momentum'][0]} -> {history['momentum'][-1]}")
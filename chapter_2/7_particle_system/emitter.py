@@ -0,0 +1,172 @@
+from collections import deque
+import numpy as np
+
+
+class Emitter:
+    """Spawns bodies from a point at a steady rate, and despawns them when they expire
+
+    An observer of a Simulation (see attach()). Every tick it spawns the
+    bodies due since the last call, in one ParticleSystem.spawn(), and
+    despawns the batches older than lifetime, in one despawn() each. The
+    bodies reuse the free rows of the system, so a running emitter does not
+    reallocate the arrays once the capacity of the system covers
+    rate * lifetime bodies.
+
+    Bodies removed in between, e.g. by an "absorb" boundary, are skipped when
+    their batch expires.
+
+    Saved in snapshots with its pending batches, see config() and from_config().
+
+    Args:
+        pos (tuple): Where the bodies appear. Can be moved at any time.
+        rate (float, optional): Bodies spawned per second
+        lifetime (float, optional): Seconds before a body is despawned, None
+                                    to keep the bodies
+        speed (tuple, optional): Range of the initial speed
+        angle (tuple, optional): Range of the initial direction, in radians
+        mass (float or tuple, optional): Mass of the bodies, or a range of masses
+        rng (numpy.random.Generator, optional): Random generator. Defaults to
+                                                the one of the simulation.
+    """
+
+    kind = "emitter"
+
+    def __init__(self, pos, rate=1000.0, lifetime=2.0, speed=(50, 100),
+                 angle=(0, 2*np.pi), mass=1.0, rng=None):
+        self.pos = pos
+        self.rate = rate
+        self.lifetime = lifetime
+        self.speed = speed
+        self.angle = angle
+        self.mass = mass
+        self.rng = rng
+        self.enabled = True
+        self.spawned = 0
+        self._pending = 0.0
+        self._time = None
+        # (expiry time, handles) of every batch, oldest first
+        self._batches = deque()
+
+    def attach(self, simulation, every=1):
+        """Emits every few ticks of a simulation
+
+        Returns:
+            Emitter: self
+        """
+        self._time = simulation.time
+        simulation.add_observer(self, every)
+        return self
+
+    def __call__(self, simulation):
+        system = simulation.system
+        now = simulation.time
+        elapsed = 0.0 if self._time is None else now - self._time
+        self._time = now
+
+        batches = self._batches
+        while batches and batches[0][0] <= now:
+            system.despawn(batches.popleft()[1])
+
+        if not self.enabled:
+            return
+        self._pending += self.rate * elapsed
+        count = int(self._pending)
+        if count:
+            self._pending -= count
+            rng = self.rng if self.rng is not None else simulation.rng
+            if rng is None:
+                rng = self.rng = np.random.default_rng()
+            handles = self.emit(system, count, rng)
+            if self.lifetime is not None:
+                batches.append((now + self.lifetime, handles))
+
+    def emit(self, system, count, rng):
+        """Spawns bodies right away, without lifetime
+
+        Args:
+            system (ParticleSystem): Where to spawn the bodies
+            count (int): Number of bodies
+            rng (numpy.random.Generator): Random generator
+
+        Returns:
+            numpy.ndarray: Handles of the new bodies
+        """
+        speed = rng.uniform(*self.speed, count)
+        angle = rng.uniform(*self.angle, count)
+        velocity = np.column_stack([speed * np.cos(angle), speed * np.sin(angle)])
+        if np.ndim(self.mass):
+            mass = rng.uniform(*self.mass, count)
+        else:
+            mass = self.mass
+        pos = np.broadcast_to(np.asarray(self.pos, dtype=float), (count, 2))
+        self.spawned += count
+        return system.spawn(mass, pos, velocity)
+
+    def config(self, system):
+        """Parameters and state of the emitter, as accepted by from_config()
+
+        The batches are stored as rows of the system, since handles are not
+        kept across a snapshot.
+
+        Args:
+            system (ParticleSystem): The system the bodies were spawned in
+
+        Returns:
+            dict: Plain JSON data
+        """
+        batches = []
+        for expiry, handles in self._batches:
+            rows = system.rows(handles)
+            batches.append([expiry, rows[rows >= 0].tolist()])
+        return {
+            "type": self.kind,
+            "pos": np.asarray(self.pos, dtype=float).tolist(),
+            "rate": self.rate,
+            "lifetime": self.lifetime,
+            "speed": list(self.speed),
+            "angle": list(self.angle),
+            "mass": list(self.mass) if np.ndim(self.mass) else self.mass,
+            "rng": None if self.rng is None else self.rng.bit_generator.state,
+            "enabled": self.enabled,
+            "spawned": self.spawned,
+            "pending": self._pending,
+            "time": self._time,
+            "batches": batches,
+        }
+
+    @classmethod
+    def from_config(cls, config, system):
+        """Rebuilds an emitter from config(), without attaching it
+
+        Args:
+            config (dict): See config()
+            system (ParticleSystem): The restored system, with the same rows
+
+        Returns:
+            Emitter: The emitter
+        """
+        rng = None
+        if config["rng"] is not None:
+            state = config["rng"]
+            rng = np.random.Generator(getattr(np.random, state["bit_generator"])())
+            rng.bit_generator.state = state
+        emitter = cls(config["pos"], rate=config["rate"], lifetime=config["lifetime"],
+                      speed=tuple(config["speed"]), angle=tuple(config["angle"]),
+                      mass=tuple(config["mass"]) if np.ndim(config["mass"]) else config["mass"],
+                      rng=rng)
+        emitter.enabled = config["enabled"]
+        emitter.spawned = config["spawned"]
+        emitter._pending = config["pending"]
+        emitter._time = config["time"]
+        for expiry, rows in config["batches"]:
+            emitter._batches.append((expiry, system.handles(np.array(rows, dtype=np.int64))))
+        return emitter
+
+    def clear(self, system):
+        """Despawns all the bodies of the emitter still alive
+
+        Args:
+            system (ParticleSystem): The system the bodies were spawned in
+        """
+        while self._batches:
+            system.despawn(self._batches.popleft()[1])
@@ -0,0 +1,266 @@
+"""Parameter sweeps: many headless runs of a scene in a process pool
+
+Example:
+    results = run_ensemble("friction_force", {"friction.mu": [0.1, 0.2, 0.4],
+                                              "num": [5, 500]})
+
+Every combination of the grid is one run. A grid key is either
+
+- a parameter of the scene function, e.g. "num", "seed" or "theta". Runs
+  sharing these start from the same bodies.
+- "<force name>.<parameter>", e.g. "friction.mu", "drag.c" or "attractor.G"
+- "integrator" or "boundary"
+
+The initial bodies of every distinct scene are built once by the parent
+process and placed in shared memory. The workers attach to it and copy only
+the state of the run they are computing, so starting a run costs neither
+pickling nor regenerating the bodies. Every run returns a small dict of
+summary metrics, which is all that travels back to the parent.
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import scenes
+import snapshot
+from boundaries import get_boundary
+from integrators import get_integrator
+
+SIMULATION_PARAMS = ("integrator", "boundary")
+
+
+def expand_grid(grid):
+    """Lists every combination of a parameter grid
+
+    Args:
+        grid (dict): Mapping of parameter names to lists of values
+
+    Returns:
+        list: One dict of parameters per combination
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+
+def summary(simulation):
+    """Default metrics of a run
+
+    Args:
+        simulation (Simulation): The simulation at the end of the run
+
+    Returns:
+        dict: Number of bodies left, centre of mass, spread of the positions,
+              mean speed and kinetic energy
+    """
+    system = simulation.system
+    mass = system.mass
+    speed_sq = np.einsum("ij,ij->i", system.velocity, system.velocity)
+    if len(system) == 0:
+        return {"bodies": 0}
+    return {
+        "bodies": len(system),
+        "center_of_mass": (mass @ system.pos / mass.sum()).tolist(),
+        "spread": float(system.pos.std(axis=0).mean()),
+        "mean_speed": float(np.sqrt(speed_sq).mean()),
+        "kinetic_energy": float(0.5 * mass @ speed_sq),
+    }
+
+
+def run_ensemble(scene, grid, ticks=2400, dt=1/240.0, seed=0, metrics=summary,
+                 processes=None, chunksize=1):
+    """Runs a scene once per combination of a parameter grid, in parallel
+
+    Args:
+        scene (str): Name of the scene, see scenes.SCENES
+        grid (dict): Mapping of parameter names to lists of values, see the
+                     module documentation
+        ticks (int, optional): Number of ticks of every run
+        dt (float, optional): Duration of a tick in seconds
+        seed (int, optional): Seed of the scenes, unless the grid has a "seed"
+        metrics (callable, optional): Function of the final simulation
+                                      returning a dict. Must be defined at
+                                      module level so it can be pickled.
+        processes (int, optional): Number of worker processes, the number of
+                                   CPUs by default. 0 runs everything in this
+                                   process.
+        chunksize (int, optional): Number of runs sent to a worker at once
+
+    Returns:
+        list: One dict per run, the parameters of the run followed by its
+              metrics and "elapsed", the duration of the run in seconds
+    """
+    runs = expand_grid(grid)
+
+    # Build the initial state of every distinct scene once, and check the
+    # parameters of every run on it before starting any worker
+    states = {}
+    checked = {}
+    for params in runs:
+        scene_params, force_params, simulation_params = _split(params)
+        key = _scene_key(scene_params, seed)
+        if key not in states:
+            simulation = scenes.SCENES[scene](**dict(key))
+            arrays = {name: getattr(simulation.system, name) for name in snapshot.ARRAYS}
+            states[key] = snapshot.describe(simulation), arrays
+            checked[key] = snapshot.restore(arrays, states[key][0])
+        _apply(checked[key], force_params, simulation_params)
+
+    # Copy all initial arrays into one shared memory block
+    layout = {}
+    size = 0
+    for key, (_, arrays) in states.items():
+        layout[key] = {}
+        for name, array in arrays.items():
+            layout[key][name] = (size, array.shape)
+            size += array.nbytes
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        for key, (_, arrays) in states.items():
+            for name, array in arrays.items():
+                offset, shape = layout[key][name]
+                np.ndarray(shape, dtype=float, buffer=block.buf, offset=offset)[:] = array
+
+        descriptions = {key: description for key, (description, _) in states.items()}
+        initargs = (block.name, layout, descriptions)
+        tasks = [(params, ticks, dt, metrics, seed) for params in runs]
+        if processes == 0:
+            _attach(*initargs)
+            return [_run(task) for task in tasks]
+        with ProcessPoolExecutor(processes or os.cpu_count(), initializer=_attach,
+                                 initargs=initargs) as executor:
+            return list(executor.map(_run, tasks, chunksize=chunksize))
+    finally:
+        _detach()
+        block.close()
+        block.unlink()
+
+
+# State of a worker process, set by _attach()
+_block = None
+_layout = None
+_descriptions = None
+
+
+def _attach(name, layout, descriptions):
+    global _block, _layout, _descriptions
+    _block = shared_memory.SharedMemory(name=name)
+    _layout = layout
+    _descriptions = descriptions
+
+
+def _detach():
+    global _block
+    if _block is not None:
+        _block.close()
+        _block = None
+
+
+def _run(task):
+    params, ticks, dt, metrics, seed = task
+    scene_params, force_params, simulation_params = _split(params)
+    key = _scene_key(scene_params, seed)
+
+    # Every run gets its own copy of the shared initial state
+    arrays = {name: np.ndarray(shape, dtype=float, buffer=_block.buf, offset=offset)
+              for name, (offset, shape) in _layout[key].items()}
+    simulation = snapshot.restore(arrays, _descriptions[key])
+
+    _apply(simulation, force_params, simulation_params)
+
+    start = time.perf_counter()
+    simulation.run(ticks, dt)
+    elapsed = time.perf_counter() - start
+    return {**params, **metrics(simulation), "elapsed": elapsed}
+
+
+def _apply(simulation, force_params, simulation_params):
+    """Sets the force and simulation parameters of a run
+
+    Raises:
+        ValueError: For an unknown force or parameter, or a parameter that
+                    can't be set
+    """
+    for (force, param), value in force_params.items():
+        if force not in simulation.forces:
+            raise ValueError(f"Unknown force {force!r}, expected one of "
+                             f"{sorted(simulation.forces.forces)}")
+        if param not in simulation.forces[force].params:
+            raise ValueError(f"{force!r} has no parameter {param!r}")
+        try:
+            setattr(simulation.forces[force], param, value)
+        except AttributeError:
+            raise ValueError(f"Parameter {param!r} of {force!r} can't be set") from None
+    if "integrator" in simulation_params:
+        simulation.integrator = get_integrator(simulation_params["integrator"])
+    if "boundary" in simulation_params:
+        simulation.boundary = get_boundary(simulation_params["boundary"])
+
+
+def _split(params):
+    """Sorts the parameters of a run into scene, force and simulation parameters
+    """
+    scene_params, force_params, simulation_params = {}, {}, {}
+    for name, value in params.items():
+        if "." in name:
+            force, param = name.split(".", 1)
+            force_params[force, param] = value
+        elif name in SIMULATION_PARAMS:
+            simulation_params[name] = value
+        else:
+            scene_params[name] = value
+    return scene_params, force_params, simulation_params
+
+
+def _parse_value(text):
+    """Number, boolean or null from the command line, otherwise the text itself
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _scene_key(scene_params, seed):
+    """Hashable arguments of the scene function, the seed defaulting to seed
+    """
+    return tuple(sorted({"seed": seed, **scene_params}.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a parameter sweep of a chapter 2 scene")
+    parser.add_argument("scene", choices=sorted(scenes.SCENES))
+    parser.add_argument("--grid", action="append", default=[], metavar="NAME=V1,V2,...",
+                        help="values of a parameter, e.g. friction.mu=0.1,0.2, num=10,100 "
+                             "or wind.force=[1,0],[4,0]")
+    parser.add_argument("--ticks", type=int, default=2400)
+    parser.add_argument("--dt", type=float, default=1/240.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--output", default=None, help="JSON file of the results")
+    args = parser.parse_args()
+
+    grid = {}
+    for item in args.grid:
+        name, values = item.split("=", 1)
+        try:
+            # JSON values, e.g. wind.force=[1,0],[4,0]
+            grid[name] = json.loads(f"[{values}]")
+        except ValueError:
+            grid[name] = [_parse_value(value) for value in values.split(",")]
+
+    start = time.perf_counter()
+    results = run_ensemble(args.scene, grid, args.ticks, args.dt, args.seed,
+                           processes=args.processes)
+    elapsed = time.perf_counter() - start
+    print(f"{len(results)} runs in {elapsed:.3f} s "
+          f"({sum(r['elapsed'] for r in results) / elapsed:.2f} run seconds per second)")
+    if args.output is None:
+        for result in results:
+            print(json.dumps(result))
+    else:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
@@ -0,0 +1,533 @@
+import numpy as np
+from gravity import attract, attract_all
+from barnes_hut import barnes_hut_attract
+from backends import compiled
+from field import GravityGrid
+
+
+class Region:
+    """Part of the canvas where a force applies
+
+    Subclasses return a boolean mask telling which bodies are inside.
+    """
+
+    kind = None
+
+    def mask(self, pos):
+        raise NotImplementedError
+
+    def config(self):
+        return {"type": self.kind, **vars(self)}
+
+
+class Below(Region):
+    """Bodies lower than y, e.g. a fluid filling the bottom of the canvas
+    """
+
+    kind = "below"
+
+    def __init__(self, y):
+        self.y = y
+
+    def mask(self, pos):
+        return pos[:, 1] < self.y
+
+
+class Above(Region):
+    """Bodies higher than y
+    """
+
+    kind = "above"
+
+    def __init__(self, y):
+        self.y = y
+
+    def mask(self, pos):
+        return pos[:, 1] > self.y
+
+
+class Box(Region):
+    """Bodies inside the rectangle [x_min, x_max] x [y_min, y_max]
+    """
+
+    kind = "box"
+
+    def __init__(self, x_min, y_min, x_max, y_max):
+        self.x_min, self.y_min = x_min, y_min
+        self.x_max, self.y_max = x_max, y_max
+
+    def mask(self, pos):
+        x, y = pos[:, 0], pos[:, 1]
+        return (x >= self.x_min) & (x <= self.x_max) & (y >= self.y_min) & (y <= self.y_max)
+
+
+class Force:
+    """Base class of the force models applied by a Simulation
+
+    A force is called with the particle system and the state to evaluate it
+    at, and returns either one force per body of shape (N, 2) or a single
+    force of shape (2,) shared by all bodies.
+
+    Set enabled to False to switch the force off without removing it, e.g. to
+    apply wind only while a mouse button is pressed. When region is set, the
+    force only acts on the bodies inside it.
+    """
+
+    kind = None
+    params = ()
+
+    enabled = True
+    region = None
+
+    def __call__(self, system, pos, velocity):
+        raise NotImplementedError
+
+    def subset(self, system, pos, velocity, index):
+        """The force on some of the bodies only, e.g. the active bodies of a
+        block timestep. The state of all bodies is still given, as the force
+        on a body may depend on the others.
+
+        Args:
+            system (ParticleSystem): The bodies the force acts on
+            pos (numpy.ndarray): Position of every body, shape (N, 2)
+            velocity (numpy.ndarray): Velocity of every body, shape (N, 2)
+            index (numpy.ndarray): Indices of the bodies, shape (K,)
+
+        Returns:
+            numpy.ndarray: Force on these bodies, shape (K, 2)
+        """
+        return np.broadcast_to(self(system, pos, velocity), pos.shape)[index]
+
+    def config(self):
+        """Description of the force, as accepted by ForceRegistry.from_config()
+        """
+        config = {"type": self.kind, "enabled": self.enabled}
+        for param in self.params:
+            value = getattr(self, param)
+            config[param] = value.tolist() if isinstance(value, np.ndarray) else value
+        if self.region is not None:
+            config["region"] = self.region.config()
+        return config
+
+
+class UniformField(Force):
+    """A force field identical everywhere on the canvas
+
+    Uniform fields are not evaluated one by one: the registry adds up all of
+    them and applies the sum in a single pass.
+
+    Args:
+        vector (tuple): The field vector
+        per_mass (bool, optional): When True the force is vector * mass (the
+                                   field is an acceleration, like gravity).
+                                   Otherwise every body feels vector.
+        enabled (bool, optional): Whether the field is on
+        region (Region, optional): Only bodies in this region feel the field
+    """
+
+    kind = "uniform"
+    params = ("vector", "per_mass")
+
+    def __init__(self, vector, per_mass=False, enabled=True, region=None):
+        self.vector = np.array(vector, dtype=float)
+        self.per_mass = per_mass
+        self.enabled = enabled
+        self.region = region
+
+    def __call__(self, system, pos, velocity):
+        if self.per_mass:
+            return system.mass[:, None] * self.vector
+        return self.vector
+
+
+class Weight(UniformField):
+    """Weight of every body, gravity * mass
+
+    Args:
+        gravity (tuple): Gravitational acceleration, e.g. (0, -10)
+    """
+
+    kind = "weight"
+    params = ("gravity",)
+
+    def __init__(self, gravity=(0, -10), enabled=True, region=None):
+        super().__init__(gravity, per_mass=True, enabled=enabled, region=region)
+
+    @property
+    def gravity(self):
+        return self.vector
+
+    @gravity.setter
+    def gravity(self, value):
+        self.vector = np.array(value, dtype=float)
+
+
+class Wind(UniformField):
+    """Constant force applied to every body regardless of its mass
+
+    Args:
+        force (tuple): The wind force, e.g. (4, 0)
+        enabled (bool, optional): Whether the wind is blowing
+    """
+
+    kind = "wind"
+    params = ("force",)
+
+    def __init__(self, force=(4, 0), enabled=True, region=None):
+        super().__init__(force, per_mass=False, enabled=enabled, region=region)
+
+    @property
+    def force(self):
+        return self.vector
+
+    @force.setter
+    def force(self, value):
+        self.vector = np.array(value, dtype=float)
+
+
+class Friction(Force):
+    """Friction against the bottom of the canvas
+
+    Bodies touching the floor feel a force of magnitude mu * mass opposing
+    their velocity.
+
+    Args:
+        mu (float): Coefficient of friction
+    """
+
+    kind = "friction"
+    params = ("mu",)
+
+    def __init__(self, mu=0.2, enabled=True, region=None):
+        self.mu = mu
+        self.enabled = enabled
+        self.region = region
+
+    def __call__(self, system, pos, velocity):
+        kernels = compiled()
+        if kernels is not None:
+            return kernels.friction(pos, velocity, system.radius, system.mass,
+                                    float(self.mu), np.empty_like(pos))
+        contact = pos[:, 1] - system.radius < 1
+        return -self.mu * system.mass[:, None] * _unit(velocity) * contact[:, None]
+
+
+class Drag(Force):
+    """Drag force of a fluid, c * speed**2 opposing the velocity
+
+    Args:
+        c (float): Drag coefficient
+        region (Region, optional): Where the fluid is. By default it fills the
+                                   whole canvas.
+    """
+
+    kind = "drag"
+    params = ("c",)
+
+    def __init__(self, c=0.003, enabled=True, region=None):
+        self.c = c
+        self.enabled = enabled
+        self.region = region
+
+    def __call__(self, system, pos, velocity):
+        kernels = compiled()
+        if kernels is not None:
+            return kernels.drag(velocity, float(self.c), np.empty_like(velocity))
+        speed = np.linalg.norm(velocity, axis=1, keepdims=True)
+        return -self.c * speed * velocity
+
+
+class Attraction(Force):
+    """Mutual gravitational attraction between all bodies
+
+    Args:
+        G (float, optional): Gravitational constant
+        min_distance_sq (float, optional): Lower clamp of the squared distance
+        max_distance_sq (float, optional): Upper clamp of the squared distance
+        theta (float, optional): Opening angle of the Barnes–Hut approximation.
+                                 None computes the exact all-pairs forces.
+    """
+
+    kind = "attraction"
+    params = ("G", "min_distance_sq", "max_distance_sq", "theta")
+
+    def __init__(self, G=1, min_distance_sq=100, max_distance_sq=1000, theta=None,
+                 enabled=True, region=None):
+        self.G = G
+        self.min_distance_sq = min_distance_sq
+        self.max_distance_sq = max_distance_sq
+        self.theta = theta
+        self.enabled = enabled
+        self.region = region
+
+    def __call__(self, system, pos, velocity):
+        if self.theta is None:
+            return attract_all(pos, system.mass, self.G, self.min_distance_sq,
+                               self.max_distance_sq)
+        return barnes_hut_attract(pos, system.mass, self.G, self.theta,
+                                  self.min_distance_sq, self.max_distance_sq)
+
+    def subset(self, system, pos, velocity, index):
+        if self.theta is not None:
+            return super().subset(system, pos, velocity, index)
+        return attract(pos[index], system.mass[index], pos, system.mass, self.G,
+                       self.min_distance_sq, self.max_distance_sq)
+
+
+class Attractor(Force):
+    """A fixed body attracting all others, like the Attractor of chapter 2.5
+
+    Args:
+        pos (tuple): Position of the attractor
+        mass (float): Mass of the attractor
+        G (float, optional): Gravitational constant
+        min_distance_sq (float, optional): Lower clamp of the squared distance
+        max_distance_sq (float, optional): Upper clamp of the squared distance
+    """
+
+    kind = "attractor"
+    params = ("pos", "mass", "G", "min_distance_sq", "max_distance_sq")
+
+    def __init__(self, pos, mass, G=5, min_distance_sq=100, max_distance_sq=1000,
+                 enabled=True, region=None):
+        self.pos = np.array(pos, dtype=float)
+        self.mass = mass
+        self.G = G
+        self.min_distance_sq = min_distance_sq
+        self.max_distance_sq = max_distance_sq
+        self.enabled = enabled
+        self.region = region
+
+    def __call__(self, system, pos, velocity):
+        return attract(pos, system.mass, self.pos, self.mass, self.G,
+                       self.min_distance_sq, self.max_distance_sq)
+
+    def subset(self, system, pos, velocity, index):
+        return attract(pos[index], system.mass[index], self.pos, self.mass, self.G,
+                       self.min_distance_sq, self.max_distance_sq)
+
+
+class Attractors(Force):
+    """Any number of fixed bodies attracting all others
+
+    Same law as Attractor, for M attractors at once. By default the force of
+    every attractor on every body is computed each tick, O(N*M). With
+    grid_cell set, their combined field is precomputed on a grid of that
+    spacing (see field.GravityGrid) and sampled for every body, O(N). The
+    grid is rebuilt only when an attractor moves, changes mass or a constant
+    changes, e.g. after attractors.pos[0] = (100, 100).
+
+    Args:
+        pos (array_like): Position of every attractor, shape (M, 2)
+        mass (array_like): Mass of every attractor, shape (M,)
+        G (float, optional): Gravitational constant
+        min_distance_sq (float, optional): Lower clamp of the squared distance
+        max_distance_sq (float, optional): Upper clamp of the squared distance
+        grid_cell (float, optional): Spacing of the precomputed field in pixels,
+                                     None computes the exact forces
+    """
+
+    kind = "attractors"
+    params = ("pos", "mass", "G", "min_distance_sq", "max_distance_sq", "grid_cell")
+
+    def __init__(self, pos, mass, G=5, min_distance_sq=100, max_distance_sq=1000,
+                 grid_cell=None, enabled=True, region=None):
+        self.pos = np.array(pos, dtype=float).reshape(-1, 2)
+        self.mass = np.array(mass, dtype=float).reshape(-1)
+        self.G = G
+        self.min_distance_sq = min_distance_sq
+        self.max_distance_sq = max_distance_sq
+        self.grid_cell = grid_cell
+        self.enabled = enabled
+        self.region = region
+        self.grid = None
+
+    def __call__(self, system, pos, velocity):
+        return self._force(system, pos, system.mass)
+
+    def subset(self, system, pos, velocity, index):
+        return self._force(system, pos[index], system.mass[index])
+
+    def _force(self, system, pos, mass):
+        if self.grid_cell is None:
+            return attract(pos, mass, self.pos, self.mass, self.G,
+                           self.min_distance_sq, self.max_distance_sq)
+
+        if self.grid is None or self.grid.cell != self.grid_cell:
+            self.grid = GravityGrid(self.grid_cell)
+        self.grid.update((system.canvas_w, system.canvas_h), self.pos, self.mass, self.G,
+                         self.min_distance_sq, self.max_distance_sq)
+
+        inside = self.grid.inside(pos)
+        if inside.all():
+            out = self.grid.sample(pos)
+        else:
+            out = np.empty_like(pos)
+            out[inside] = self.grid.sample(pos[inside])
+            outside = ~inside
+            out[outside] = attract(pos[outside], np.ones(outside.sum()), self.pos,
+                                   self.mass, self.G, self.min_distance_sq,
+                                   self.max_distance_sq)
+        out *= mass[:, None]
+        return out
+
+
+FORCE_TYPES = {
+    force.kind: force
+    for force in (UniformField, Weight, Wind, Friction, Drag, Attraction, Attractor,
+                  Attractors)
+}
+
+REGION_TYPES = {region.kind: region for region in (Below, Above, Box)}
+
+
+class ForceRegistry:
+    """Named collection of the forces acting on a particle system
+
+    The forces are evaluated for the whole population at once. All uniform
+    fields acting everywhere are first added up, so gravity, wind and any
+    other constant field cost a single pass over the bodies whatever their
+    number. Every other force is one vectorized call, masked by its region
+    when it has one.
+
+    Args:
+        forces (list or dict, optional): Forces to register. A list is named
+                                         after the kind of every force.
+    """
+
+    def __init__(self, forces=()):
+        self.forces = {}
+        if isinstance(forces, dict):
+            forces = forces.items()
+        else:
+            forces = [(None, force) for force in forces]
+        for name, force in forces:
+            self.register(force, name)
+
+    def __len__(self):
+        return len(self.forces)
+
+    def __iter__(self):
+        return iter(self.forces.values())
+
+    def __contains__(self, name):
+        return name in self.forces
+
+    def __getitem__(self, name):
+        return self.forces[name]
+
+    def register(self, force, name=None):
+        """Adds a force under a unique name and returns it
+
+        Args:
+            force (Force): The force to add
+            name (str, optional): Name of the force. Defaults to its kind, with
+                                  a numeric suffix when already taken.
+        """
+        if name is None:
+            base = name = force.kind or type(force).__name__.lower()
+            suffix = 2
+            while name in self.forces:
+                name = f"{base}_{suffix}"
+                suffix += 1
+        elif name in self.forces:
+            raise KeyError(f"A force named {name!r} is already registered")
+        self.forces[name] = force
+        return force
+
+    def remove(self, name):
+        """Removes the force registered under name and returns it
+        """
+        return self.forces.pop(name)
+
+    def evaluate(self, system, pos, velocity, out=None, index=None):
+        """Net force of all enabled forces at the given state
+
+        Args:
+            system (ParticleSystem): The bodies the forces act on
+            pos (numpy.ndarray): Position of every body, shape (N, 2)
+            velocity (numpy.ndarray): Velocity of every body, shape (N, 2)
+            out (numpy.ndarray, optional): Array to write the forces in
+            index (numpy.ndarray, optional): Only compute the forces on these
+                                             bodies, see Force.subset()
+
+        Returns:
+            numpy.ndarray: Net force on every body, shape (N, 2), or on the
+                           bodies of index, shape (K, 2)
+        """
+        mass = system.mass if index is None else system.mass[index]
+        if out is None:
+            out = np.empty((len(mass), 2))
+
+        # Uniform fields acting everywhere are summed before touching the bodies
+        field = np.zeros(2)
+        force = np.zeros(2)
+        others = []
+        for item in self.forces.values():
+            if not item.enabled:
+                continue
+            if isinstance(item, UniformField) and item.region is None:
+                if item.per_mass:
+                    field += item.vector
+                else:
+                    force += item.vector
+            else:
+                others.append(item)
+
+        np.multiply(mass[:, None], field, out=out)
+        out += force
+
+        for item in others:
+            if index is None:
+                value = item(system, pos, velocity)
+                if item.region is not None:
+                    value = value * item.region.mask(pos)[:, None]
+            else:
+                value = item.subset(system, pos, velocity, index)
+                if item.region is not None:
+                    value = value * item.region.mask(pos[index])[:, None]
+            out += value
+        return out
+
+    def config(self):
+        """Declarative description of all forces, see from_config()
+        """
+        return {name: force.config() for name, force in self.forces.items()}
+
+    @classmethod
+    def from_config(cls, config):
+        """Builds a registry from a declarative description
+
+        Example:
+            ForceRegistry.from_config({
+                "weight": {"type": "weight", "gravity": [0, -10]},
+                "drag": {"type": "drag", "c": 0.003,
+                         "region": {"type": "below", "y": 200}},
+            })
+
+        Args:
+            config (dict): Mapping of names to force descriptions. Every
+                           description has a "type" (see FORCE_TYPES), the
+                           parameters of that force, and optionally
+                           "enabled" and a "region" (see REGION_TYPES).
+
+        Returns:
+            ForceRegistry: The registry
+        """
+        registry = cls()
+        for name, description in config.items():
+            description = dict(description)
+            force_type = FORCE_TYPES[description.pop("type")]
+            region = description.pop("region", None)
+            if region is not None:
+                region = dict(region)
+                region = REGION_TYPES[region.pop("type")](**region)
+            registry.register(force_type(region=region, **description), name)
+        return registry
+
+
+def _unit(vectors):
+    """Normalises every row, leaving zero vectors untouched
+    """
+    norm = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norm, out=np.zeros_like(vectors), where=norm > 0)
@@ -0,0 +1,181 @@
+import numpy as np
+from backends import compiled, executor, get_threads
+
+# Number of pair interactions evaluated at once. A tile of rows is sized so
+# that every temporary array holds about this many floats (512 kB), which
+# keeps the temporaries in cache and the memory bounded for any N.
+TILE_PAIRS = 2**16
+
+# Below this many pairs the forces are computed in the calling thread, as
+# handing tiles to the thread pool would cost more than it saves
+MIN_THREADED_PAIRS = 2**18
+
+
+def attract(pos, mass, source_pos, source_mass, G=1, min_distance_sq=100,
+            max_distance_sq=1000, tile=None, out=None):
+    """Gravitational force applied by every source body on every target body
+
+    Batched version of Mover.attract(). The force on target i is
+
+        sum_j G*m_i*m_j / clamp(|p_j - p_i|**2) * unit(p_j - p_i)
+
+    where the squared distance is clamped to [min_distance_sq, max_distance_sq].
+    Pairs at zero distance (e.g. a body with itself) add no force.
+
+    The targets are processed in tiles of rows, so memory stays bounded for
+    any number of bodies. With several threads (see backends.set_threads())
+    the tiles are computed in parallel.
+
+    Args:
+        pos (numpy.ndarray): Position of the targets, shape (N, 2)
+        mass (numpy.ndarray): Mass of the targets, shape (N,)
+        source_pos (numpy.ndarray): Position of the attracting bodies, shape (M, 2)
+        source_mass (numpy.ndarray): Mass of the attracting bodies, shape (M,)
+        G (float, optional): Gravitational constant
+        min_distance_sq (float, optional): Lower clamp of the squared distance
+        max_distance_sq (float, optional): Upper clamp of the squared distance
+        tile (int, optional): Number of target rows per tile. By default it is
+                              chosen from TILE_PAIRS, or from the number of
+                              threads with the numba backend.
+        out (numpy.ndarray, optional): Array of shape (N, 2) to write the forces in
+
+    Returns:
+        numpy.ndarray: Force on every target, shape (N, 2)
+    """
+    pos = np.asarray(pos, dtype=float)
+    mass = np.asarray(mass, dtype=float)
+    source_pos = np.asarray(source_pos, dtype=float).reshape(-1, 2)
+    source_mass = np.asarray(source_mass, dtype=float).reshape(-1)
+
+    num = len(mass)
+    if out is None:
+        out = np.empty((num, 2))
+    kernels = compiled()
+    pool = executor()
+    if num * len(source_mass) < MIN_THREADED_PAIRS:
+        pool = None
+
+    # Every tile owns the rows start:stop of out, so the threads never write
+    # to the same memory and need no lock
+    if kernels is not None:
+        args = (pos, mass, source_pos, source_mass, float(G), float(min_distance_sq),
+                float(max_distance_sq), out)
+        if pool is None:
+            return kernels.attract(*args)
+        if tile is None:
+            tile = -(-num // (4 * get_threads()))
+        tasks = [pool.submit(kernels.attract_rows, *args, start, min(start + tile, num))
+                 for start in range(0, num, tile)]
+    else:
+        if tile is None:
+            tile = max(1, TILE_PAIRS // max(1, len(source_mass)))
+        tiles = [slice(start, min(start + tile, num)) for start in range(0, num, tile)]
+        if pool is None:
+            for rows in tiles:
+                _attract_rows(pos[rows], mass[rows], source_pos, source_mass,
+                              G, min_distance_sq, max_distance_sq, out[rows])
+            return out
+        tasks = [pool.submit(_attract_rows, pos[rows], mass[rows], source_pos, source_mass,
+                             G, min_distance_sq, max_distance_sq, out[rows])
+                 for rows in tiles]
+
+    for task in tasks:
+        task.result()
+    return out
+
+
+def attract_all(pos, mass, G=1, min_distance_sq=100, max_distance_sq=1000,
+                tile=None, out=None):
+    """Mutual gravitational force between all pairs of bodies
+
+    Batched version of the double loop calling mover.attract(other) for every
+    pair of movers.
+
+    Args:
+        pos (numpy.ndarray): Position of the bodies, shape (N, 2)
+        mass (numpy.ndarray): Mass of the bodies, shape (N,)
+        G (float, optional): Gravitational constant
+        min_distance_sq (float, optional): Lower clamp of the squared distance
+        max_distance_sq (float, optional): Upper clamp of the squared distance
+        tile (int, optional): Number of rows per tile
+        out (numpy.ndarray, optional): Array of shape (N, 2) to write the forces in
+
+    Returns:
+        numpy.ndarray: Net force on every body, shape (N, 2)
+    """
+    return attract(pos, mass, pos, mass, G, min_distance_sq, max_distance_sq,
+                   tile, out)
+
+
+def potential(pos, mass, source_pos, source_mass, G=1, min_distance_sq=100,
+              max_distance_sq=1000, tile=None):
+    """Potential energy of every target in the field of the source bodies
+
+    The potential of the clamped force of attract(), continuous and zero at
+    infinity for the unclamped part. With r_min and r_max the square roots of
+    the clamps, the potential of a pair at distance r is G*m_i*m_j times
+
+        r / r_min**2 - 2 / r_min    if r < r_min
+        -1 / r                      if r_min <= r <= r_max
+        r / r_max**2 - 2 / r_max    if r > r_max
+
+    Pairs at zero distance count for nothing, as they feel no force.
+
+    Args:
+        pos (numpy.ndarray): Position of the targets, shape (N, 2)
+        mass (numpy.ndarray): Mass of the targets, shape (N,)
+        source_pos (numpy.ndarray): Position of the attracting bodies, shape (M, 2)
+        source_mass (numpy.ndarray): Mass of the attracting bodies, shape (M,)
+        G (float, optional): Gravitational constant
+        min_distance_sq (float, optional): Lower clamp of the squared distance
+        max_distance_sq (float, optional): Upper clamp of the squared distance
+        tile (int, optional): Number of target rows per tile
+
+    Returns:
+        numpy.ndarray: Potential energy of every target, shape (N,). For
+                       mutual attraction the total is half their sum.
+    """
+    pos = np.asarray(pos, dtype=float)
+    mass = np.asarray(mass, dtype=float)
+    source_pos = np.asarray(source_pos, dtype=float).reshape(-1, 2)
+    source_mass = np.asarray(source_mass, dtype=float).reshape(-1)
+    r_min = np.sqrt(min_distance_sq)
+    r_max = np.sqrt(max_distance_sq)
+
+    num = len(mass)
+    out = np.empty(num)
+    if tile is None:
+        tile = max(1, TILE_PAIRS // max(1, len(source_mass)))
+    for start in range(0, num, tile):
+        stop = min(start + tile, num)
+        delta = source_pos - pos[start:stop, None]
+        r = np.sqrt(np.einsum("ijk,ijk->ij", delta, delta))
+        u = np.where(r < r_min, r / min_distance_sq - 2 / r_min,
+                     np.where(r > r_max, r / max_distance_sq - 2 / r_max,
+                              -1 / np.maximum(r, r_min)))
+        u[r == 0] = 0
+        out[start:stop] = u @ source_mass
+    out *= G * mass
+    return out
+
+
+def _attract_rows(pos, mass, source_pos, source_mass, G, min_distance_sq,
+                  max_distance_sq, out):
+    """Computes the forces on one tile of targets, writing them into out
+    """
+    dx = source_pos[:, 0] - pos[:, 0, None]
+    dy = source_pos[:, 1] - pos[:, 1, None]
+    distance_sq = dx*dx
+    distance_sq += dy*dy
+
+    # strength / distance, so that (dx, dy) * scale has the right magnitude.
+    # Pairs at zero distance keep a zero denominator and are skipped.
+    clamped = np.clip(distance_sq, min_distance_sq, max_distance_sq)
+    scale = np.sqrt(distance_sq, out=distance_sq)
+    scale *= clamped
+    np.divide(G*source_mass, scale, out=scale, where=scale > 0)
+
+    out[:, 0] = np.einsum("ij,ij->i", dx, scale)
+    out[:, 1] = np.einsum("ij,ij->i", dy, scale)
+    out *= mass[:, None]
+    return out
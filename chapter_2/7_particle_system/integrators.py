@@ -0,0 +1,140 @@
+from backends import compiled
+
+
+class Integrator:
+    """Base class of the schemes advancing a whole particle system by one step
+
+    An integrator is given the particle system, the step dt and a function
+    acceleration(pos, velocity) returning the acceleration of every body at
+    any state, so higher order schemes can evaluate the forces several times
+    per step.
+
+    Accelerations already accumulated in system.acceleration (e.g. from
+    forces applied with system.apply_force() before the step) are added to
+    the evaluated ones, held constant over the step, and cleared afterwards.
+    """
+
+    name = None
+
+    def step(self, system, dt, acceleration):
+        raise NotImplementedError
+
+    def reset(self):
+        """Forgets any state kept between steps
+        """
+
+
+class LegacyEuler(Integrator):
+    """The update of the chapter 2 Mover, velocity += acceleration
+
+    The acceleration is added once per tick, without the dt factor, so the
+    forces are in units of the original scenes. Only the position update
+    depends on dt.
+    """
+
+    name = "legacy"
+
+    def step(self, system, dt, acceleration):
+        system.acceleration += acceleration(system.pos, system.velocity)
+        system.update(dt)
+
+
+class SemiImplicitEuler(Integrator):
+    """Symplectic Euler: updates the velocity first, then the position with it
+    """
+
+    name = "euler"
+
+    def step(self, system, dt, acceleration):
+        kernels = compiled()
+        if kernels is not None:
+            kernels.euler_update(system.pos, system.velocity,
+                                 acceleration(system.pos, system.velocity),
+                                 system.acceleration, float(dt))
+            return
+        a = acceleration(system.pos, system.velocity) + system.acceleration
+        system.velocity += a * dt
+        system.pos += system.velocity * dt
+        system.acceleration[:] = 0
+
+
+class VelocityVerlet(Integrator):
+    """Second order, time reversible scheme with one force evaluation per step
+
+    The acceleration at the end of a step is kept for the beginning of the
+    next one, unless bodies were added or removed in between.
+    """
+
+    name = "verlet"
+
+    def __init__(self):
+        self._acceleration = None
+        self._revision = None
+
+    def reset(self):
+        self._acceleration = None
+
+    def step(self, system, dt, acceleration):
+        a = self._acceleration
+        if a is None or self._revision != system.revision:
+            a = acceleration(system.pos, system.velocity)
+        external = system.acceleration
+        a = a + external
+
+        system.pos += system.velocity * dt + 0.5 * a * dt*dt
+        # Velocity-dependent forces are evaluated at the predicted velocity
+        a_next = acceleration(system.pos, system.velocity + a * dt)
+        system.velocity += 0.5 * (a + a_next + external) * dt
+
+        self._acceleration = a_next
+        self._revision = system.revision
+        system.acceleration[:] = 0
+
+
+class RK4(Integrator):
+    """Classic fourth order Runge–Kutta, four force evaluations per step
+    """
+
+    name = "rk4"
+
+    def step(self, system, dt, acceleration):
+        external = system.acceleration
+        pos, velocity = system.pos, system.velocity
+
+        k1_x = velocity
+        k1_v = acceleration(pos, velocity) + external
+        k2_x = velocity + 0.5*dt*k1_v
+        k2_v = acceleration(pos + 0.5*dt*k1_x, k2_x) + external
+        k3_x = velocity + 0.5*dt*k2_v
+        k3_v = acceleration(pos + 0.5*dt*k2_x, k3_x) + external
+        k4_x = velocity + dt*k3_v
+        k4_v = acceleration(pos + dt*k3_x, k4_x) + external
+
+        system.pos += dt/6 * (k1_x + 2*k2_x + 2*k3_x + k4_x)
+        system.velocity += dt/6 * (k1_v + 2*k2_v + 2*k3_v + k4_v)
+        system.acceleration[:] = 0
+
+
+INTEGRATORS = {
+    integrator.name: integrator
+    for integrator in (LegacyEuler, SemiImplicitEuler, VelocityVerlet, RK4)
+}
+
+
+def get_integrator(integrator):
+    """Returns an integrator instance from its name
+
+    Args:
+        integrator (str or Integrator): One of "legacy", "euler", "verlet" and
+                                        "rk4", or an Integrator instance
+
+    Returns:
+        Integrator: The integrator
+    """
+    if isinstance(integrator, Integrator):
+        return integrator
+    try:
+        return INTEGRATORS[integrator]()
+    except KeyError:
+        raise ValueError(f"Unknown integrator {integrator!r}, "
+                         f"expected one of {sorted(INTEGRATORS)}") from None
@@ -0,0 +1,84 @@
+from vec import VecView
+
+
+class Mover:
+    """A thin view of one body stored in a ParticleSystem
+
+    The Mover does not own any state. Its position, velocity and acceleration
+    are rows of the arrays kept by the ParticleSystem, so reading or writing
+    them goes straight to the shared storage.
+
+    pos, velocity and acceleration are VecView objects with the interface of
+    pyglet Vec2, created once and reused, so the code of the chapter 2 Movers
+    (self.velocity = self.velocity + self.acceleration, ...) keeps working.
+    Their in-place operations (+=, normalize_ip(), ...) allocate nothing.
+
+    Args:
+        system (ParticleSystem): The system that stores the body
+        index (int): Row of the body in the system arrays
+    """
+
+    __slots__ = ("system", "index", "_pos", "_velocity", "_acceleration")
+
+    def __init__(self, system, index):
+        self.system = system
+        self.index = index
+        self._pos = self._velocity = self._acceleration = None
+
+    def __repr__(self):
+        return f"Mover(index={self.index}, mass={self.mass}, pos={self.pos})"
+
+    @property
+    def mass(self):
+        return self.system.mass[self.index]
+
+    @property
+    def radius(self):
+        return self.system.radius[self.index]
+
+    # Views of the storage of the system, recreated when it grew (see ParticleSystem.reserve)
+
+    @property
+    def pos(self):
+        view = self._pos
+        storage = self.system.storage["pos"]
+        if view is None or view.array is not storage:
+            view = self._pos = VecView(storage, self.index)
+        return view
+
+    @pos.setter
+    def pos(self, value):
+        self.pos.set(value)
+
+    @property
+    def velocity(self):
+        view = self._velocity
+        storage = self.system.storage["velocity"]
+        if view is None or view.array is not storage:
+            view = self._velocity = VecView(storage, self.index)
+        return view
+
+    @velocity.setter
+    def velocity(self, value):
+        self.velocity.set(value)
+
+    @property
+    def acceleration(self):
+        view = self._acceleration
+        storage = self.system.storage["acceleration"]
+        if view is None or view.array is not storage:
+            view = self._acceleration = VecView(storage, self.index)
+        return view
+
+    @acceleration.setter
+    def acceleration(self, value):
+        self.acceleration.set(value)
+
+    def apply_force(self, force):
+        """Apply a force to the mover.
+
+        Args:
+            force (Vec2 or numpy.ndarray): A vector of the shape (2,)
+                                           Example, numpy.array([1,1])
+        """
+        self.acceleration.add_scaled_ip(force, 1 / self.mass)
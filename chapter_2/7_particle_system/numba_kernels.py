@@ -0,0 +1,115 @@
+"""Numba versions of the hot kernels, see backends.py
+
+Every kernel is a plain loop over the bodies compiled to machine code, so
+no temporary arrays are allocated. They release the GIL (nogil=True) and
+their results match the NumPy kernels to round-off. Compiled functions are
+cached on disk after the first run.
+
+Importing this module raises ImportError when Numba is not installed.
+"""
+import math
+import numba
+
+_jit = numba.njit(cache=True, nogil=True)
+
+
+@_jit
+def attract(pos, mass, source_pos, source_mass, G, min_distance_sq, max_distance_sq,
+            out):
+    """Gravitational force on every target, see gravity.attract()
+    """
+    return attract_rows(pos, mass, source_pos, source_mass, G, min_distance_sq,
+                        max_distance_sq, out, 0, len(mass))
+
+
+@_jit
+def attract_rows(pos, mass, source_pos, source_mass, G, min_distance_sq,
+                 max_distance_sq, out, start, stop):
+    """Gravitational force on the targets start:stop only, writing out[start:stop]
+    """
+    for i in range(start, stop):
+        x = pos[i, 0]
+        y = pos[i, 1]
+        fx = 0.0
+        fy = 0.0
+        for j in range(len(source_mass)):
+            dx = source_pos[j, 0] - x
+            dy = source_pos[j, 1] - y
+            distance_sq = dx*dx + dy*dy
+            if distance_sq == 0.0:
+                continue
+            clamped = min(max(distance_sq, min_distance_sq), max_distance_sq)
+            scale = G*source_mass[j] / (math.sqrt(distance_sq) * clamped)
+            fx += dx * scale
+            fy += dy * scale
+        out[i, 0] = fx * mass[i]
+        out[i, 1] = fy * mass[i]
+    return out
+
+
+@_jit
+def friction(pos, velocity, radius, mass, mu, out):
+    """Friction against the floor, see forces.Friction
+    """
+    for i in range(len(mass)):
+        out[i, 0] = 0.0
+        out[i, 1] = 0.0
+        if pos[i, 1] - radius[i] < 1:
+            norm = math.sqrt(velocity[i, 0]**2 + velocity[i, 1]**2)
+            if norm > 0:
+                out[i, 0] = -mu * mass[i] * velocity[i, 0] / norm
+                out[i, 1] = -mu * mass[i] * velocity[i, 1] / norm
+    return out
+
+
+@_jit
+def drag(velocity, c, out):
+    """Drag of a fluid, see forces.Drag
+    """
+    for i in range(len(velocity)):
+        speed = math.sqrt(velocity[i, 0]**2 + velocity[i, 1]**2)
+        out[i, 0] = -c * speed * velocity[i, 0]
+        out[i, 1] = -c * speed * velocity[i, 1]
+    return out
+
+
+@_jit
+def bounce(pos, velocity, radius, canvas_w, canvas_h, restitution):
+    """Bounce on the edges of the canvas, see Boundary("bounce")
+    """
+    hits = 0
+    for i in range(len(radius)):
+        hit = False
+        for axis in range(2):
+            size = canvas_w if axis == 0 else canvas_h
+            low = pos[i, axis] <= radius[i]
+            high = pos[i, axis] >= size - radius[i]
+            pos[i, axis] = min(max(pos[i, axis], radius[i]), size - radius[i])
+            if (low and velocity[i, axis] < 0) or (high and velocity[i, axis] > 0):
+                velocity[i, axis] *= -restitution
+            hit = hit or low or high
+        if hit:
+            hits += 1
+    return hits
+
+
+@_jit
+def legacy_update(pos, velocity, acceleration, dt):
+    """velocity += acceleration, pos += velocity * dt, see ParticleSystem.update()
+    """
+    for i in range(len(pos)):
+        for axis in range(2):
+            velocity[i, axis] += acceleration[i, axis]
+            pos[i, axis] += velocity[i, axis] * dt
+            acceleration[i, axis] = 0.0
+
+
+@_jit
+def euler_update(pos, velocity, acceleration, external, dt):
+    """Semi-implicit Euler step, see integrators.SemiImplicitEuler
+    """
+    for i in range(len(pos)):
+        for axis in range(2):
+            velocity[i, axis] += (acceleration[i, axis] + external[i, axis]) * dt
+            pos[i, axis] += velocity[i, axis] * dt
+            external[i, axis] = 0.0
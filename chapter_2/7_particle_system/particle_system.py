@@ -0,0 +1,108 @@
+import pyglet
+from pyglet.window import key, mouse
+import scenes
+from timestep import FixedTimestep
+from rendering import PointRenderer
+from profiling import Profiler, Overlay
+from interaction import MouseInteraction
+
+
+# Define window/canvas size
+canvas = pyglet.window.Window(600, 600)
+
+# Define the simulation. Set theta (e.g. 0.5) to use the Barnes–Hut
+# approximation instead of the exact all-pairs forces.
+simulation = scenes.mutual_attraction(num=500, canvas_size=canvas.get_size(), theta=None)
+
+# Define drawing batch and sprites
+main_batch = pyglet.graphics.Batch()
+background = pyglet.shapes.Rectangle(x=0, y=0, width=600, height=600,
+                                     batch=main_batch, color=(0, 0, 0, 50))
+
+# All bodies are points of a single vertex list, updated in one copy per frame
+renderer = PointRenderer(simulation.system, batch=main_batch,
+                         group=pyglet.graphics.Group(order=1))
+
+# The physics runs at a fixed 240 ticks/s whatever the frame rate, and the
+# bodies are drawn at positions interpolated between two ticks
+loop = FixedTimestep(simulation, step=1/240.0, max_substeps=8)
+
+# Press P to time every stage of the ticks and the drawing, shown top left
+profiler = Profiler()
+overlay = Overlay(profiler, batch=main_batch, group=pyglet.graphics.Group(order=2))
+
+# Hover a body to highlight it, drag it with the left button and throw it on
+# release, right click to blast the bodies around the cursor away
+interaction = MouseInteraction(simulation).attach()
+cursor = None
+
+
+@canvas.event
+def on_draw():
+    """Initialising canvas and drawing all sprites.
+    """
+    # canvas.clear()
+
+    if cursor is not None:
+        renderer.highlight(interaction.hover(*cursor))
+
+    if simulation.profiler is None:
+        renderer.update(loop.interpolated_pos())
+
+        # Note: Here, we are using the 'advanced' batch draw option
+        # More info in https://pyglet.readthedocs.io/en/latest/modules/graphics/index.html
+        main_batch.draw()
+    else:
+        with profiler.timer("draw"):
+            renderer.update(loop.interpolated_pos())
+            main_batch.draw()
+
+
+@canvas.event
+def on_mouse_motion(x, y, dx, dy):
+    global cursor
+    cursor = (x, y)
+
+
+@canvas.event
+def on_mouse_leave(x, y):
+    global cursor
+    cursor = None
+    renderer.highlight(())
+
+
+@canvas.event
+def on_mouse_press(x, y, button, modifiers):
+    if button == mouse.LEFT:
+        interaction.grab(x, y)
+    elif button == mouse.RIGHT:
+        interaction.blast(x, y)
+
+
+@canvas.event
+def on_mouse_drag(x, y, dx, dy, buttons, modifiers):
+    global cursor
+    cursor = (x, y)
+    if buttons & mouse.LEFT:
+        interaction.drag(x, y)
+
+
+@canvas.event
+def on_mouse_release(x, y, button, modifiers):
+    if button == mouse.LEFT:
+        interaction.release()
+
+
+@canvas.event
+def on_key_press(symbol, modifiers):
+    """Switches the profiler and its overlay on and off
+    """
+    if symbol == key.P:
+        profiling = simulation.profiler is None
+        simulation.profiler = profiler if profiling else None
+        overlay.visible = profiling
+
+
+if __name__ == "__main__":
+    pyglet.clock.schedule(loop.advance)
+    pyglet.app.run()
@@ -0,0 +1,428 @@
+import numpy as np
+from mover import Mover
+from boundaries import Boundary
+from backends import compiled
+
+# A handle packs the generation of a slot in the high 32 bits and the slot in the low ones
+_SLOT_BITS = 32
+_SLOT_MASK = 2**_SLOT_BITS - 1
+_GENERATION_MASK = 2**31 - 1
+
+# Arrays with one row per body, in the order of the storage
+_ARRAYS = ("mass", "radius", "pos", "velocity", "acceleration")
+
+
+class ParticleSystem:
+    """Keeps the state of many movers in contiguous numpy arrays
+
+    Instead of every Mover holding its own position, velocity and
+    acceleration, all bodies share one array per quantity. A body is just a
+    row in those arrays, so update() and check_edges() run once for all of
+    them.
+
+    The arrays are views of the first len(system) rows of buffers holding
+    capacity rows, so bodies can be added with spawn() and removed with
+    despawn() during a run without reallocating anything (until the capacity
+    is exceeded, which doubles it). Do not assign new arrays to system.pos
+    and co., write into them instead.
+
+    spawn() returns handles: integers naming a body for as long as it lives,
+    while its row changes when other bodies are despawned. A handle of a
+    despawned body stays invalid even once its slot is reused.
+
+    Args:
+        mass (array_like): Mass of every body, shape (N,)
+        pos (array_like): Position of every body, shape (N, 2)
+        velocity (array_like, optional): Velocity of every body, shape (N, 2).
+                                         Defaults to zeros.
+        canvas_size (tuple, optional): Width and height of the screen in pixels
+        radius_scale (float, optional): The radius of a body is sqrt(mass)*radius_scale
+        acceleration (array_like, optional): Pending acceleration of every body,
+                                             shape (N, 2). Defaults to zeros.
+        copy (bool, optional): When False, arrays that already are float64 are
+                               used as they are instead of copied, e.g. the
+                               memory-mapped arrays of a snapshot. Ignored
+                               when capacity is larger than N.
+        capacity (int, optional): Number of bodies the buffers can hold
+                                  before growing. Defaults to N.
+    """
+
+    def __init__(self, mass, pos, velocity=None, canvas_size=(400, 400),
+                 radius_scale=10, acceleration=None, copy=True, capacity=None):
+        mass = np.asarray(mass, dtype=float).reshape(-1)
+        num = len(mass)
+        capacity = max(num, capacity or 0)
+        arrays = {
+            "mass": mass,
+            "radius": np.sqrt(mass) * radius_scale,
+            "pos": np.asarray(pos, dtype=float).reshape(num, 2),
+            "velocity": (np.zeros((num, 2)) if velocity is None
+                         else np.asarray(velocity, dtype=float).reshape(num, 2)),
+            "acceleration": (np.zeros((num, 2)) if acceleration is None
+                             else np.asarray(acceleration, dtype=float).reshape(num, 2)),
+        }
+        if copy or capacity > num:
+            for name, array in arrays.items():
+                buffer = np.zeros((capacity,) + array.shape[1:])
+                buffer[:num] = array
+                arrays[name] = buffer
+        self.storage = arrays
+
+        # Slot of every row, row of every slot (-1 when free), and a stack of free slots
+        self._slot = np.arange(capacity, dtype=np.int64)
+        self._row = np.where(self._slot < num, self._slot, -1)
+        self._generation = np.zeros(capacity, dtype=np.int64)
+        self._free = self._slot[::-1].copy()
+        self._free_count = capacity - num
+
+        self.radius_scale = radius_scale
+        self.canvas_w, self.canvas_h = canvas_size
+        self.revision = 0
+        self._movers = []
+        self._resize(num)
+
+    @property
+    def capacity(self):
+        """Number of bodies the buffers hold before growing
+        """
+        return len(self._slot)
+
+    def _resize(self, num):
+        # Views of the live rows, and a new revision for the caches keyed on rows
+        storage = self.storage
+        self.mass = storage["mass"][:num]
+        self.radius = storage["radius"][:num]
+        self.pos = storage["pos"][:num]
+        self.velocity = storage["velocity"][:num]
+        self.acceleration = storage["acceleration"][:num]
+        self.revision += 1
+
+    def __len__(self):
+        return len(self.mass)
+
+    def __getitem__(self, index):
+        """Returns a Mover view of the body at index
+        """
+        if not -len(self) <= index < len(self):
+            raise IndexError("particle index out of range")
+        return self._mover(index % len(self))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._mover(index)
+
+    def _mover(self, index):
+        # One Mover per row, created on first use and reused with its vector views
+        movers = self._movers
+        if index >= len(movers):
+            movers.extend(Mover(self, row) for row in range(len(movers), index + 1))
+        return movers[index]
+
+    def apply_force(self, force, index=None):
+        """Apply a force to the bodies.
+
+        Args:
+            force (numpy.ndarray): Either a single force of shape (2,) applied to
+                                   every body, or one force per body of shape (N, 2)
+            index (int or numpy.ndarray, optional): Only apply the force to these bodies
+        """
+        if index is None:
+            self.acceleration += np.asarray(force) / self.mass[:, None]
+        else:
+            mass = self.mass[index]
+            self.acceleration[index] += np.asarray(force) / np.asarray(mass)[..., None]
+
+    def apply_gravity(self, gravity):
+        """Apply a weight force (gravity * mass) to every body.
+
+        As the weight is proportional to the mass, the acceleration is simply gravity.
+
+        Args:
+            gravity (numpy.ndarray): Gravitational acceleration of shape (2,)
+        """
+        self.acceleration += gravity
+
+    def update(self, dt):
+        """Updates the position of every body
+
+        Args:
+            dt (float): The number of seconds since the last “tick”.
+                        Typically obtained from  pyglet.clock.schedule_interval()
+        """
+        kernels = compiled()
+        if kernels is not None:
+            kernels.legacy_update(self.pos, self.velocity, self.acceleration, float(dt))
+            return
+        self.velocity += self.acceleration
+        self.pos += self.velocity * dt
+        self.acceleration[:] = 0
+
+    def check_edges(self):
+        """Keeps every body inside the canvas, bouncing on the edges
+        """
+        Boundary("bounce").apply(self)
+
+    def remove(self, index):
+        """Removes bodies from the system
+
+        The remaining bodies keep their order but move to lower rows, so Mover
+        views of bodies after a removed one point to a different body. Their
+        handles stay valid.
+
+        Args:
+            index (int, numpy.ndarray): Index or boolean mask of the bodies to remove
+        """
+        num = len(self)
+        keep = np.ones(num, dtype=bool)
+        keep[index] = False
+        self._release(np.flatnonzero(~keep))
+        kept = np.flatnonzero(keep)
+        for array in self.storage.values():
+            array[:len(kept)] = array[kept]
+        self._slot[:len(kept)] = self._slot[kept]
+        self._row[self._slot[:len(kept)]] = np.arange(len(kept))
+        self._resize(len(kept))
+
+    def reserve(self, capacity):
+        """Grows the buffers to hold at least capacity bodies
+
+        The arrays are reallocated, so views of the old ones (e.g. Mover
+        vectors) are recreated on their next use.
+
+        Args:
+            capacity (int): Number of bodies
+        """
+        old = self.capacity
+        if capacity <= old:
+            return
+        num = len(self)
+        for name, array in self.storage.items():
+            buffer = np.zeros((capacity,) + array.shape[1:])
+            buffer[:num] = array[:num]
+            self.storage[name] = buffer
+        self._slot = np.concatenate([self._slot, np.arange(old, capacity)])
+        self._row = np.concatenate([self._row, np.full(capacity - old, -1)])
+        self._generation = np.concatenate([self._generation,
+                                           np.zeros(capacity - old, dtype=np.int64)])
+        # New slots below the old free ones, which are taken first
+        free = np.empty(capacity, dtype=np.int64)
+        free[:capacity - old] = np.arange(capacity - 1, old - 1, -1)
+        free[capacity - old:capacity - old + self._free_count] = self._free[:self._free_count]
+        self._free = free
+        self._free_count += capacity - old
+        self._resize(num)
+
+    def spawn(self, mass, pos, velocity=None):
+        """Adds bodies at the end of the arrays, reusing free slots
+
+        Args:
+            mass (float or array_like): Mass of the new bodies, shape (K,) or one for all
+            pos (array_like): Position of the new bodies, shape (K, 2)
+            velocity (array_like, optional): Velocity of the new bodies, shape
+                                             (K, 2) or (2,). Defaults to zeros.
+
+        Returns:
+            numpy.ndarray: Handle of every new body, shape (K,)
+        """
+        pos = np.asarray(pos, dtype=float).reshape(-1, 2)
+        count = len(pos)
+        num = len(self)
+        if num + count > self.capacity:
+            self.reserve(max(num + count, 2 * self.capacity))
+
+        rows = slice(num, num + count)
+        storage = self.storage
+        storage["mass"][rows] = mass
+        storage["radius"][rows] = np.sqrt(storage["mass"][rows]) * self.radius_scale
+        storage["pos"][rows] = pos
+        storage["velocity"][rows] = 0 if velocity is None else velocity
+        storage["acceleration"][rows] = 0
+
+        # Free slots are popped from the end of the stack
+        slots = self._free[self._free_count - count:self._free_count][::-1].copy()
+        self._free_count -= count
+        self._slot[rows] = slots
+        self._row[slots] = np.arange(num, num + count)
+        self._resize(num + count)
+        return (self._generation[slots] << _SLOT_BITS) | slots
+
+    def despawn(self, handles):
+        """Removes bodies by handle, moving the last bodies into their rows
+
+        Unlike remove(), the order of the remaining bodies is not kept: the
+        cost only depends on the number of removed bodies. Handles of bodies
+        already removed are ignored.
+
+        Args:
+            handles (int or array_like): Handles returned by spawn() or handles()
+
+        Returns:
+            int: Number of bodies removed
+        """
+        rows = self.rows(handles).reshape(-1)
+        rows = np.unique(rows[rows >= 0])
+        count = len(rows)
+        if not count:
+            return 0
+        num = len(self)
+        remaining = num - count
+        self._release(rows)
+
+        # Rows left empty before the new end are filled by the live rows after it
+        holes = rows[rows < remaining]
+        tail = np.arange(remaining, num)
+        moved = tail[self._row[self._slot[tail]] >= 0]
+        for array in self.storage.values():
+            array[holes] = array[moved]
+        self._slot[holes] = self._slot[moved]
+        self._row[self._slot[holes]] = holes
+        self._resize(remaining)
+        return count
+
+    def _release(self, rows):
+        # Frees the slots of these rows and invalidates their handles
+        slots = self._slot[rows]
+        self._row[slots] = -1
+        self._generation[slots] = (self._generation[slots] + 1) & _GENERATION_MASK
+        self._free[self._free_count:self._free_count + len(slots)] = slots
+        self._free_count += len(slots)
+
+    def handles(self, index=None):
+        """Handles of the bodies at some rows
+
+        Args:
+            index (int or numpy.ndarray, optional): Rows. Defaults to all bodies.
+
+        Returns:
+            numpy.ndarray: The handles, in the order of the rows
+        """
+        slots = self._slot[:len(self)] if index is None else self._slot[:len(self)][index]
+        return (self._generation[slots] << _SLOT_BITS) | slots
+
+    def rows(self, handles):
+        """Current row of bodies given by handle
+
+        Args:
+            handles (int or array_like): The handles
+
+        Returns:
+            numpy.ndarray: Row of every handle, -1 for bodies that were removed
+        """
+        handles = np.asarray(handles, dtype=np.int64)
+        flat = handles.reshape(-1)
+        slots = flat & _SLOT_MASK
+        rows = np.full(len(flat), -1, dtype=np.int64)
+        valid = slots < self.capacity
+        valid[valid] = self._generation[slots[valid]] == flat[valid] >> _SLOT_BITS
+        rows[valid] = self._row[slots[valid]]
+        return rows.reshape(handles.shape)
+
+    def alive(self, handles):
+        """Whether bodies given by handle are still in the system
+
+        Returns:
+            numpy.ndarray: Boolean mask, same shape as handles
+        """
+        return self.rows(handles) >= 0
+
+
+def check_handles(steps=2000, seed=0, capacity=4):
+    """Runs random spawn(), despawn(), remove() and reserve() calls against a plain list
+
+    After every call the system has to hold the same bodies as the list, in
+    the same rows: spawn() appends, remove() keeps the order of the remaining
+    bodies and despawn() fills the freed rows, lowest first, with the live
+    bodies after the new end, in order. Every handle of the list has to
+    give its body, including across the reallocations of a growing system,
+    and every despawned handle has to stay invalid when its slot is reused.
+
+    Args:
+        steps (int, optional): Number of random calls
+        seed (int, optional): Seed of the random calls
+        capacity (int, optional): Initial capacity, small to grow often
+
+    Returns:
+        dict: "passed", the first "failure" (None if passed), and the
+              number of "reallocations" and "reused_slots" exercised
+    """
+    rng = np.random.default_rng(seed)
+    system = ParticleSystem(np.ones(2), rng.uniform(0, 400, (2, 2)), capacity=capacity)
+    # (handle, mass) of every body, in the order of the rows
+    bodies = list(zip(system.handles().tolist(), system.mass.tolist()))
+    dead = []
+    dead_slots = set()
+    reallocations = reused = 0
+
+    def failure(step, action, message):
+        return {"passed": False, "failure": f"step {step}, {action}: {message}",
+                "reallocations": reallocations, "reused_slots": reused}
+
+    for step in range(steps):
+        roll = rng.random()
+        if roll < 0.5 or not bodies:
+            action = "spawn"
+            mass = rng.uniform(1, 10, int(rng.integers(1, 6)))
+            storage = system.storage["mass"]
+            handles = system.spawn(mass, rng.uniform(0, 400, (len(mass), 2)))
+            reallocations += system.storage["mass"] is not storage
+            reused += sum(handle & _SLOT_MASK in dead_slots for handle in handles.tolist())
+            bodies += zip(handles.tolist(), mass.tolist())
+        elif roll < 0.85:
+            action = "despawn"
+            rows = np.sort(rng.choice(len(bodies), int(rng.integers(1, len(bodies) + 1)),
+                                      replace=False))
+            handles = [bodies[row][0] for row in rows]
+            # Handles given twice or already despawned are ignored
+            if system.despawn(handles + handles[:1] + dead[-1:]) != len(handles):
+                return failure(step, action, "wrong number of bodies removed")
+            remaining = len(bodies) - len(rows)
+            holes = rows[rows < remaining]
+            removed = set(rows.tolist())
+            moved = [row for row in range(remaining, len(bodies)) if row not in removed]
+            for hole, row in zip(holes, moved):
+                bodies[hole] = bodies[row]
+            del bodies[remaining:]
+            dead += handles
+            dead_slots.update(handle & _SLOT_MASK for handle in handles)
+        elif roll < 0.95:
+            action = "remove"
+            mask = rng.random(len(bodies)) < 0.3
+            system.remove(mask)
+            handles = [handle for (handle, _), gone in zip(bodies, mask) if gone]
+            dead += handles
+            dead_slots.update(handle & _SLOT_MASK for handle in handles)
+            bodies = [body for body, gone in zip(bodies, mask) if not gone]
+        else:
+            action = "reserve"
+            storage = system.storage["mass"]
+            system.reserve(system.capacity + int(rng.integers(0, 8)))
+            reallocations += system.storage["mass"] is not storage
+
+        handles = np.array([handle for handle, _ in bodies], dtype=np.int64)
+        if len(system) != len(bodies) or not np.array_equal(system.handles(), handles):
+            return failure(step, action, "rows out of order")
+        if not np.array_equal(system.rows(handles), np.arange(len(bodies))):
+            return failure(step, action, "handle not pointing to its row")
+        if not np.array_equal(system.mass, [mass for _, mass in bodies]):
+            return failure(step, action, "body data not moved with its handle")
+        if dead and system.alive(np.array(dead, dtype=np.int64)).any():
+            return failure(step, action, "despawned handle still alive")
+
+    return {"passed": True, "failure": None, "reallocations": reallocations,
+            "reused_slots": reused}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check the handles and row order of "
+                                                 "spawn(), despawn() and remove()")
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    result = check_handles(args.steps, args.seed)
+    print(f"{'passed' if result['passed'] else 'FAILED'}: {args.steps} random calls, "
+          f"{result['reallocations']} reallocations, {result['reused_slots']} reused slots")
+    if not result["passed"]:
+        print(result["failure"])
@@ -0,0 +1,193 @@
+"""Per-stage timings of a simulation, with rolling percentiles
+
+Attach a Profiler to a simulation to time every stage of every tick:
+
+    simulation.profiler = Profiler()
+    simulation.run(2400)
+    print(simulation.profiler.report())
+
+The stages of a tick are "boundary", "forces" (evaluation of the force
+models), "integrate" (the integrator, without the force evaluations),
+"collisions", "observers" and "tick", the whole step. Anything else, e.g. the
+drawing of a frame, can be timed with profiler.timer("draw").
+
+Every stage keeps its last `window` durations in a ring buffer, from which
+the percentiles are computed on demand. Without profiler (the default),
+Simulation.step() does not read the clock at all.
+"""
+import time
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import pyglet
+except Exception:
+    pyglet = None
+
+
+class Profiler:
+    """Rolling record of the durations of named stages
+
+    Args:
+        window (int, optional): Number of most recent durations kept per stage
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._samples = {}
+        self._counts = {}
+
+    def record(self, stage, seconds):
+        """Adds the duration of one run of a stage
+
+        Args:
+            stage (str): Name of the stage
+            seconds (float): Duration in seconds
+        """
+        count = self._counts.get(stage)
+        if count is None:
+            self._samples[stage] = np.empty(self.window)
+            count = 0
+        self._samples[stage][count % self.window] = seconds
+        self._counts[stage] = count + 1
+
+    @contextmanager
+    def timer(self, stage):
+        """Times the body of a with statement as a stage
+
+        Example:
+            with profiler.timer("draw"):
+                main_batch.draw()
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def wrap(self, stage, function):
+        """Returns function, timed as a stage every time it is called
+        """
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    @property
+    def stages(self):
+        """Names of the stages recorded so far, in order of first appearance
+        """
+        return list(self._samples)
+
+    def samples(self, stage):
+        """The durations kept for a stage, oldest first
+
+        Args:
+            stage (str): Name of the stage
+
+        Returns:
+            numpy.ndarray: Durations in seconds, at most window of them
+        """
+        count = self._counts.get(stage, 0)
+        if count == 0:
+            return np.empty(0)
+        samples = self._samples[stage]
+        if count <= self.window:
+            return samples[:count].copy()
+        return np.roll(samples, -(count % self.window))
+
+    def percentiles(self, stage, q=(50, 95, 99)):
+        """Percentiles of the recent durations of a stage
+
+        Args:
+            stage (str): Name of the stage
+            q (tuple, optional): Percentiles to compute
+
+        Returns:
+            numpy.ndarray: Durations in seconds, one per percentile, NaN when
+                           the stage was never recorded
+        """
+        samples = self.samples(stage)
+        if len(samples) == 0:
+            return np.full(len(q), np.nan)
+        return np.percentile(samples, q)
+
+    def summary(self):
+        """Statistics of every stage
+
+        Returns:
+            dict: For every stage, "count" (runs since the start or the last
+                  reset) and the mean, p50, p95 and p99 of the recent
+                  durations in milliseconds
+        """
+        summary = {}
+        for stage in self._samples:
+            p50, p95, p99 = self.percentiles(stage) * 1e3
+            summary[stage] = {"count": self._counts[stage],
+                              "mean": float(self.samples(stage).mean() * 1e3),
+                              "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+        return summary
+
+    def report(self):
+        """The summary as a text table
+        """
+        lines = [f"{'stage':<11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"]
+        for stage, stats in self.summary().items():
+            lines.append(f"{stage:<11}{stats['p50']:>9.3f}{stats['p95']:>9.3f}"
+                         f"{stats['p99']:>9.3f}")
+        return "\n".join(lines)
+
+    def reset(self):
+        """Forgets all durations
+        """
+        self._samples.clear()
+        self._counts.clear()
+
+
+class Overlay:
+    """Shows the report of a profiler in a corner of a pyglet window
+
+    The text is only rebuilt every `interval` seconds, so the overlay costs
+    about nothing between two refreshes.
+
+    Args:
+        profiler (Profiler): The profiler to show
+        x (float, optional): Left of the text
+        y (float, optional): Top of the text
+        interval (float, optional): Seconds between two refreshes of the text
+        batch (pyglet.graphics.Batch, optional): Batch to add the text to
+        group (pyglet.graphics.Group, optional): Group of the text
+    """
+
+    def __init__(self, profiler, x=5, y=595, interval=0.5, batch=None, group=None):
+        if pyglet is None:
+            raise RuntimeError("Overlay needs pyglet")
+        self.profiler = profiler
+        self.label = pyglet.text.Label("", font_name="monospace", font_size=9,
+                                       x=x, y=y, anchor_y="top", width=320,
+                                       multiline=True, color=(255, 255, 0, 255),
+                                       batch=batch, group=group)
+        self.interval = interval
+        self._scheduled = False
+
+    @property
+    def visible(self):
+        return self._scheduled
+
+    @visible.setter
+    def visible(self, visible):
+        if visible and not self._scheduled:
+            pyglet.clock.schedule_interval(self.refresh, self.interval)
+            self.refresh()
+        elif not visible and self._scheduled:
+            pyglet.clock.unschedule(self.refresh)
+            self.label.text = ""
+        self._scheduled = visible
+
+    def refresh(self, dt=None):
+        """Rebuilds the text from the profiler
+        """
+        self.label.text = self.profiler.report()
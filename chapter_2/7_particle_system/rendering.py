@@ -0,0 +1,283 @@
+import numpy as np
+
+try:
+    import pyglet
+    from pyglet.gl import (glEnable, glDisable, glBlendFunc, GL_BLEND, GL_POINTS,
+                           GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA, GL_PROGRAM_POINT_SIZE)
+except Exception:
+    # pyglet is missing or there is no display: only SoftwareRenderer works
+    pyglet = None
+
+_VERTEX_SOURCE = """#version 150 core
+    in vec2 position;
+    in float size;
+    in vec4 colors;
+
+    out vec4 vertex_colors;
+
+    uniform WindowBlock
+    {
+        mat4 projection;
+        mat4 view;
+    } window;
+
+    void main()
+    {
+        gl_Position = window.projection * window.view * vec4(position, 0.0, 1.0);
+        gl_PointSize = size;
+        vertex_colors = colors;
+    }
+"""
+
+_FRAGMENT_SOURCE = """#version 150 core
+    in vec4 vertex_colors;
+    out vec4 final_color;
+
+    void main()
+    {
+        // Round point sprites: drop the corners of the square
+        vec2 offset = gl_PointCoord - vec2(0.5);
+        if (dot(offset, offset) > 0.25) {
+            discard;
+        }
+        final_color = vertex_colors;
+    }
+"""
+
+# Coordinate of the vertices of the PointRenderer without a body
+_HIDDEN = -1e6
+
+
+class PointRenderer:
+    """Draws all the bodies of a particle system as one list of point sprites
+
+    Every body is one vertex of a single pyglet vertex list, drawn as a round
+    point as wide as the body. update() copies all positions into the vertex
+    buffer at once, instead of setting x and y on one shape per body.
+
+    The vertex list has one vertex per row of the storage of the system (its
+    capacity), so bodies spawned and despawned during a run reuse the same
+    vertices. Vertices past the live bodies are drawn with size 0, far
+    outside the canvas.
+
+    Needs an OpenGL context, i.e. a pyglet window.
+
+    Args:
+        system (ParticleSystem): The bodies to draw
+        color (tuple, optional): RGBA color of the bodies
+        batch (pyglet.graphics.Batch, optional): Batch to add the points to
+        group (pyglet.graphics.Group, optional): Parent group of the points
+    """
+
+    def __init__(self, system, color=(255, 255, 255, 255), batch=None, group=None):
+        if pyglet is None:
+            raise RuntimeError("PointRenderer needs pyglet and a display")
+        program = pyglet.graphics.shader.ShaderProgram(
+            pyglet.graphics.shader.Shader(_VERTEX_SOURCE, "vertex"),
+            pyglet.graphics.shader.Shader(_FRAGMENT_SOURCE, "fragment"))
+        self.group = _PointGroup(program, parent=group)
+        self.system = system
+        self.color = np.asarray(color, dtype=np.uint8)
+
+        num = system.capacity
+        self.vertex_list = program.vertex_list(
+            num, GL_POINTS, batch=batch, group=self.group,
+            position=("f", np.zeros(2 * num, dtype=np.float32)),
+            size=("f", np.zeros(num, dtype=np.float32)),
+            colors=("Bn", np.tile(self.color, num)))
+        self._revision = None
+        self._live = num
+        self._highlighted = np.empty(0, dtype=np.int64)
+
+    def refresh(self):
+        """Updates the sizes and the unused vertices after bodies were added or removed
+
+        Called by update() when needed. The vertex list only grows with the
+        capacity of the system.
+        """
+        system = self.system
+        if self.vertex_list.count < system.capacity:
+            self.vertex_list.resize(system.capacity)
+            self.vertex_list.colors[:] = np.tile(self.color, system.capacity)
+            self._live = self.vertex_list.count
+        num = len(system)
+        size = np.ctypeslib.as_array(self.vertex_list.size)
+        size[:num] = 2 * system.radius
+        if self._live > num:
+            size[num:self._live] = 0
+            position = np.ctypeslib.as_array(self.vertex_list.position)
+            position[2 * num:2 * self._live] = _HIDDEN
+        self._live = num
+        self._revision = system.revision
+        # Rows may now hold other bodies
+        self.highlight(())
+
+    def highlight(self, rows, color=(255, 80, 80, 255)):
+        """Draws some bodies in another color, and the previous ones in the normal color
+
+        Args:
+            rows (array_like): Rows of the bodies to highlight, -1 are ignored.
+                               Empty to clear the highlight.
+            color (tuple, optional): RGBA color of the highlighted bodies
+        """
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        rows = rows[rows >= 0]
+        colors = np.ctypeslib.as_array(self.vertex_list.colors).reshape(-1, 4)
+        colors[self._highlighted] = self.color
+        colors[rows] = color
+        self._highlighted = rows
+
+    def update(self, pos=None):
+        """Copies the positions of all bodies into the vertex buffer
+
+        Args:
+            pos (numpy.ndarray, optional): Positions to draw, shape (N, 2), e.g.
+                                           interpolated ones. Defaults to the
+                                           positions of the system.
+        """
+        if self._revision != self.system.revision:
+            self.refresh()
+        if pos is None:
+            pos = self.system.pos
+        buffer = np.ctypeslib.as_array(self.vertex_list.position)
+        buffer[:2 * len(pos)] = np.ravel(pos)
+
+    def draw(self):
+        """Draws the points, when they are not part of a batch
+        """
+        self.group.set_state_recursive()
+        self.vertex_list.draw(GL_POINTS)
+        self.group.unset_state_recursive()
+
+
+class SoftwareRenderer:
+    """Rasterizes the bodies of a particle system into a numpy image
+
+    Fallback of PointRenderer when there is no OpenGL context, e.g. on a
+    machine without display. The bodies are stamped as filled discs, all the
+    bodies of the same size at once.
+
+    Args:
+        system (ParticleSystem): The bodies to draw
+        color (tuple, optional): RGB(A) color of the bodies. The alpha is ignored.
+        background (tuple, optional): RGB color of the background
+        canvas_size (tuple, optional): Size of the image in pixels. Defaults to
+                                       the canvas of the system.
+    """
+
+    def __init__(self, system, color=(255, 255, 255, 255), background=(0, 0, 0),
+                 canvas_size=None):
+        self.system = system
+        self.color = np.array(color[:3], dtype=np.uint8)
+        self.background = np.array(background, dtype=np.uint8)
+        width, height = canvas_size or (system.canvas_w, system.canvas_h)
+        self.image = np.empty((int(height), int(width), 3), dtype=np.uint8)
+        self.image[:] = self.background
+        self.pos = system.pos
+        self._discs = {}
+
+    def update(self, pos=None):
+        """Sets the positions to draw on the next call to draw()
+
+        Args:
+            pos (numpy.ndarray, optional): Positions to draw, shape (N, 2).
+                                           Defaults to the positions of the system.
+        """
+        self.pos = self.system.pos if pos is None else pos
+
+    def clear(self):
+        """Fills the image with the background color
+        """
+        self.image[:] = self.background
+
+    def fade(self, alpha):
+        """Blends the background color over the image, leaving trails
+
+        Same as drawing a translucent background rectangle before the bodies.
+
+        Args:
+            alpha (float): Opacity of the background, 0 to 1
+        """
+        faded = self.image * (1 - alpha) + self.background * alpha
+        np.rint(faded, out=faded)
+        self.image[:] = faded
+
+    def draw(self, clear=True):
+        """Rasterizes the bodies
+
+        Args:
+            clear (bool, optional): Clear the image first
+
+        Returns:
+            numpy.ndarray: The image, shape (height, width, 3), first row at the top
+        """
+        if clear:
+            self.clear()
+        self.stamp(self.image, self.pos, self.system.radius, self.color)
+        return self.image
+
+    def stamp(self, image, pos, radius, color):
+        """Draws filled discs into an image
+
+        Args:
+            image (numpy.ndarray): The image, shape (height, width, 3)
+            pos (numpy.ndarray): Centre of the discs in canvas coordinates
+                                 (origin at the bottom left), shape (N, 2)
+            radius (numpy.ndarray): Radius of the discs, shape (N,)
+            color (numpy.ndarray): RGB color of the discs
+        """
+        height, width = image.shape[:2]
+        flat = image.reshape(-1, image.shape[2])
+        centre = np.rint(pos).astype(np.int64)
+        sizes = np.maximum(np.rint(radius), 0).astype(np.int64)
+
+        for size in np.unique(sizes):
+            which = sizes == size
+            dx, dy = self._disc(int(size))
+            x = centre[which, 0, None] + dx
+            y = (height - 1) - (centre[which, 1, None] + dy)
+            inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+            flat[(y * width + x)[inside]] = color
+
+    def _disc(self, size):
+        """Pixel offsets of a disc of radius size, cached by size
+        """
+        if size not in self._discs:
+            dy, dx = np.mgrid[-size:size + 1, -size:size + 1]
+            inside = dx*dx + dy*dy <= size*size
+            self._discs[size] = dx[inside], dy[inside]
+        return self._discs[size]
+
+
+def make_renderer(system, **kwargs):
+    """Returns a PointRenderer, or a SoftwareRenderer without OpenGL context
+
+    Args:
+        system (ParticleSystem): The bodies to draw
+        **kwargs: Passed on to the renderer. Arguments only meaningful for
+                  the other renderer are dropped.
+    """
+    if pyglet is None or pyglet.gl.current_context is None:
+        kwargs.pop("batch", None)
+        kwargs.pop("group", None)
+        return SoftwareRenderer(system, **kwargs)
+    kwargs.pop("background", None)
+    kwargs.pop("canvas_size", None)
+    return PointRenderer(system, **kwargs)
+
+
+if pyglet is not None:
+    class _PointGroup(pyglet.graphics.ShaderGroup):
+        """Binds the point sprite program, with blending and program point sizes
+        """
+
+        def set_state(self):
+            super().set_state()
+            glEnable(GL_PROGRAM_POINT_SIZE)
+            glEnable(GL_BLEND)
+            glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+
+        def unset_state(self):
+            glDisable(GL_BLEND)
+            glDisable(GL_PROGRAM_POINT_SIZE)
+            super().unset_state()
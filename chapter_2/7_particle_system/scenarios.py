@@ -0,0 +1,128 @@
+"""Seeded initial conditions for many bodies, generated in one vectorized step
+
+Replaces the mover_list() helpers of the chapter 2 scripts, which call
+random.randint once per mover and read the size of a live canvas. The
+same seed always gives the same bodies, so scenes can be used for
+benchmarks and regression runs.
+"""
+import numpy as np
+from particles import ParticleSystem
+
+
+def uniform(num, seed=None, canvas_size=(600, 600), mass_range=(10, 25),
+            velocity_range=(0, 5), radius_scale=2):
+    """Bodies spread uniformly over the canvas
+
+    Args:
+        num (int): Number of bodies
+        seed (int, optional): Seed of the random generator
+        canvas_size (tuple, optional): Width and height of the canvas
+        mass_range (tuple, optional): Bounds of the (integer) masses, inclusive
+        velocity_range (tuple, optional): Bounds of every velocity component
+        radius_scale (float, optional): The radius of a body is sqrt(mass)*radius_scale
+
+    Returns:
+        ParticleSystem: The bodies
+    """
+    rng = np.random.default_rng(seed)
+    mass = _masses(rng, num, mass_range)
+    pos = rng.uniform((0, 0), canvas_size, (num, 2))
+    velocity = rng.uniform(*velocity_range, (num, 2))
+    return ParticleSystem(mass, pos, velocity, canvas_size, radius_scale)
+
+
+def ring(num, seed=None, canvas_size=(600, 600), center=None, radius_range=(150, 200),
+         speed_range=(10, 15), mass_range=(10, 25), clockwise=False, radius_scale=2):
+    """Bodies on a ring around a centre, moving perpendicular to it
+
+    This is what 6_mutual_attraction sets out to do with from_magnitude()
+    and rotate(pi/2): every body starts at a random distance from the centre
+    with a velocity tangent to its orbit.
+
+    Args:
+        num (int): Number of bodies
+        seed (int, optional): Seed of the random generator
+        canvas_size (tuple, optional): Width and height of the canvas
+        center (tuple, optional): Centre of the ring, the middle of the canvas by default
+        radius_range (tuple, optional): Bounds of the distance to the centre
+        speed_range (tuple, optional): Bounds of the orbital speed
+        mass_range (tuple, optional): Bounds of the (integer) masses, inclusive
+        clockwise (bool, optional): Direction of the orbits
+        radius_scale (float, optional): The radius of a body is sqrt(mass)*radius_scale
+
+    Returns:
+        ParticleSystem: The bodies
+    """
+    rng = np.random.default_rng(seed)
+    if center is None:
+        center = np.array(canvas_size, dtype=float) / 2
+    mass = _masses(rng, num, mass_range)
+    angle = rng.uniform(0, 2*np.pi, num)
+    distance = rng.uniform(*radius_range, num)
+    speed = rng.uniform(*speed_range, num)
+
+    direction = np.column_stack([np.cos(angle), np.sin(angle)])
+    tangent = direction[:, ::-1] * (1, -1) if clockwise else direction[:, ::-1] * (-1, 1)
+    pos = np.asarray(center, dtype=float) + direction * distance[:, None]
+    velocity = tangent * speed[:, None]
+    return ParticleSystem(mass, pos, velocity, canvas_size, radius_scale)
+
+
+def clustered(num, seed=None, canvas_size=(600, 600), clusters=4, spread=30,
+              mass_range=(10, 25), velocity_range=(0, 5), radius_scale=2):
+    """Bodies grouped in Gaussian clusters placed at random on the canvas
+
+    Args:
+        num (int): Number of bodies
+        seed (int, optional): Seed of the random generator
+        canvas_size (tuple, optional): Width and height of the canvas
+        clusters (int, optional): Number of clusters
+        spread (float, optional): Standard deviation of a cluster in pixels
+        mass_range (tuple, optional): Bounds of the (integer) masses, inclusive
+        velocity_range (tuple, optional): Bounds of every velocity component
+        radius_scale (float, optional): The radius of a body is sqrt(mass)*radius_scale
+
+    Returns:
+        ParticleSystem: The bodies
+    """
+    rng = np.random.default_rng(seed)
+    mass = _masses(rng, num, mass_range)
+    centers = rng.uniform((0, 0), canvas_size, (clusters, 2))
+    member = rng.integers(0, clusters, num)
+    pos = centers[member] + rng.normal(0, spread, (num, 2))
+    velocity = rng.uniform(*velocity_range, (num, 2))
+    return ParticleSystem(mass, pos, velocity, canvas_size, radius_scale)
+
+
+DISTRIBUTIONS = {
+    "uniform": uniform,
+    "ring": ring,
+    "clustered": clustered,
+}
+
+
+def make_system(distribution, num, seed=None, **kwargs):
+    """Generates bodies from a distribution name
+
+    Args:
+        distribution (str): One of "uniform", "ring" and "clustered"
+        num (int): Number of bodies
+        seed (int, optional): Seed of the random generator
+        **kwargs: Parameters of the distribution
+
+    Returns:
+        ParticleSystem: The bodies
+    """
+    try:
+        generate = DISTRIBUTIONS[distribution]
+    except KeyError:
+        raise ValueError(f"Unknown distribution {distribution!r}, "
+                         f"expected one of {sorted(DISTRIBUTIONS)}") from None
+    return generate(num, seed=seed, **kwargs)
+
+
+def _masses(rng, num, mass_range):
+    """Integer masses between the bounds of mass_range, inclusive like randint
+    """
+    low, high = mass_range
+    return rng.integers(low, high + 1, num).astype(float)
@@ -0,0 +1,138 @@
+"""Headless versions of the chapter 2 scenes
+
+Every function builds a Simulation with the same bodies and force models as
+the pyglet script of the matching chapter 2 folder. The forces are
+registered under their kind (e.g. simulation.forces["wind"]). The wind forces
+start disabled, as in the scripts they only blow while a mouse button is pressed.
+"""
+import numpy as np
+from particles import ParticleSystem
+from scenarios import make_system
+from simulation import Simulation
+from forces import Weight, Wind, Friction, Drag, Attraction, Attractor, Attractors, Below
+from emitter import Emitter
+
+
+def simulating_forces(num=1, seed=None, canvas_size=(400, 400)):
+    """1_simulating_forces: movers of mass 1 under gravity and wind
+    """
+    canvas_w, canvas_h = canvas_size
+    x = canvas_w * np.arange(1, num + 1) / (num + 1)
+    system = ParticleSystem(mass=np.ones(num),
+                            pos=np.column_stack([x, np.full(num, canvas_h/2)]),
+                            canvas_size=canvas_size, radius_scale=10)
+    return Simulation(system, [Weight((0, -10)), Wind((4, 0), enabled=False)])
+
+
+def mass_and_acceleration(num=2, seed=None, canvas_size=(400, 400)):
+    """2_mass_and_acceleration: movers of mass 2 and 4 under gravity and wind
+    """
+    canvas_w, canvas_h = canvas_size
+    x = canvas_w * (2*np.arange(num) + 1) / (2*num)
+    system = ParticleSystem(mass=np.where(np.arange(num) % 2, 4., 2.),
+                            pos=np.column_stack([x, np.full(num, canvas_h/2)]),
+                            canvas_size=canvas_size, radius_scale=10)
+    return Simulation(system, [Weight((0, -10)), Wind((4, 0), enabled=False)])
+
+
+def friction_force(num=5, seed=None, canvas_size=(400, 400)):
+    """3_friction_force: movers sliding on the floor with friction
+    """
+    rng = np.random.default_rng(seed)
+    canvas_w, _ = canvas_size
+    system = ParticleSystem(mass=rng.integers(1, 11, num),
+                            pos=np.column_stack([rng.integers(1, canvas_w + 1, num),
+                                                 np.full(num, 220)]),
+                            canvas_size=canvas_size, radius_scale=10)
+    return Simulation(system, [Weight((0, -10)), Friction(mu=0.2),
+                               Wind((-4, 0), enabled=False)])
+
+
+def drag_force(num=5, seed=None, canvas_size=(400, 400)):
+    """4_drag_force: movers falling into a fluid filling the bottom half
+    """
+    rng = np.random.default_rng(seed)
+    canvas_w, canvas_h = canvas_size
+    system = ParticleSystem(mass=rng.integers(3, 11, num),
+                            pos=np.column_stack([rng.integers(1, canvas_w + 1, num),
+                                                 np.full(num, 300)]),
+                            canvas_size=canvas_size, radius_scale=10)
+    return Simulation(system, [Weight((0, -10)), Friction(mu=0.2),
+                               Wind((-4, 0), enabled=False),
+                               Drag(c=0.003, region=Below(canvas_h/2))])
+
+
+def gravitational_attraction(num=10, seed=None, canvas_size=(400, 400),
+                             distribution="uniform", min_distance_sq=100):
+    """5_gravitational_attraction: movers orbiting a fixed attractor
+
+    distribution is one of scenarios.DISTRIBUTIONS. min_distance_sq is the
+    lower clamp of the squared distance, which can be lowered when the scene
+    runs with adaptive steps (see adaptive.py).
+    """
+    canvas_w, canvas_h = canvas_size
+    system = make_system(distribution, num, seed, canvas_size=canvas_size,
+                         mass_range=(50, 150))
+    attractor = Attractor(pos=(canvas_w/2, canvas_h/2), mass=100, G=5,
+                          min_distance_sq=min_distance_sq)
+    return Simulation(system, [attractor], boundary=None)
+
+
+def mutual_attraction(num=20, seed=None, canvas_size=(600, 600), theta=None,
+                      distribution="uniform", min_distance_sq=100):
+    """6_mutual_attraction: movers attracting each other around a sun
+
+    distribution is one of scenarios.DISTRIBUTIONS, e.g. "ring" to start
+    the movers orbiting the sun. See gravitational_attraction() for
+    min_distance_sq.
+    """
+    canvas_w, canvas_h = canvas_size
+    system = make_system(distribution, num, seed, canvas_size=canvas_size,
+                         mass_range=(10, 25))
+    sun = Attractor(pos=(canvas_w/2, canvas_h/2), mass=500, G=1,
+                    min_distance_sq=min_distance_sq)
+    attraction = Attraction(G=1, min_distance_sq=min_distance_sq, theta=theta)
+    return Simulation(system, [sun, attraction], boundary=None)
+
+
+def attractor_field(num=2000, seed=None, canvas_size=(600, 600), wells=16, grid_cell=4.0):
+    """5_gravitational_attraction with many fixed attractors and many light movers
+
+    The field of the attractors is precomputed on a grid of grid_cell pixels,
+    or computed exactly every tick when grid_cell is None.
+    """
+    rng = np.random.default_rng(seed)
+    canvas_w, canvas_h = canvas_size
+    wells = Attractors(pos=rng.uniform((50, 50), (canvas_w - 50, canvas_h - 50), (wells, 2)),
+                       mass=rng.integers(50, 151, wells), G=5, grid_cell=grid_cell)
+    system = make_system("uniform", num, seed, canvas_size=canvas_size, mass_range=(1, 5))
+    return Simulation(system, [wells], boundary="wrap")
+
+
+def fountain(num=1000, seed=None, canvas_size=(600, 600), lifetime=3.0):
+    """A jet of particles spawned at the bottom of the canvas, falling back under gravity
+
+    About num particles are alive at any time: the emitter spawns
+    num / lifetime particles per second into a pool of num rows, and
+    despawns them after lifetime seconds, or when they leave the canvas.
+    """
+    canvas_w, _ = canvas_size
+    system = ParticleSystem(mass=np.empty(0), pos=np.empty((0, 2)), canvas_size=canvas_size,
+                            radius_scale=2, capacity=num)
+    simulation = Simulation(system, [Weight((0, -300))], boundary="absorb",
+                            integrator="euler", rng=np.random.default_rng(seed))
+    Emitter(pos=(canvas_w/2, 10), rate=num/lifetime, lifetime=lifetime, speed=(350, 450),
+            angle=(np.pi/2 - 0.25, np.pi/2 + 0.25), mass=(1, 4)).attach(simulation)
+    return simulation
+
+
+SCENES = {
+    "simulating_forces": simulating_forces,
+    "mass_and_acceleration": mass_and_acceleration,
+    "friction_force": friction_force,
+    "drag_force": drag_force,
+    "gravitational_attraction": gravitational_attraction,
+    "mutual_attraction": mutual_attraction,
+    "attractor_field": attractor_field,
+    "fountain": fountain,
+}
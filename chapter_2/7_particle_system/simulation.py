@@ -0,0 +1,232 @@
+import argparse
+import inspect
+import time
+import numpy as np
+from integrators import INTEGRATORS, get_integrator
+from forces import ForceRegistry
+from boundaries import Boundary, get_boundary
+from profiling import Profiler
+from backends import BACKENDS, set_backend, set_threads
+
+
+class Simulation:
+    """Steps a particle system under a set of force models, without a window
+
+    The physics does not depend on pyglet: a Simulation can run for a fixed
+    number of ticks on a machine without display. Drawing is just one more
+    observer, called after every tick (or every few ticks).
+
+    Args:
+        system (ParticleSystem): The bodies to simulate
+        forces (list, dict or ForceRegistry, optional): Force models applied
+            every tick, see forces.py. A list is named after the kind of every
+            force, e.g. simulation.forces["wind"].
+        boundary (str or Boundary, optional): What happens at the edges of the
+            canvas: "bounce", "wrap", "absorb" (see boundaries.py), or None to
+            let the bodies leave the canvas
+        integrator (str or Integrator, optional): Scheme advancing the bodies,
+            one of "legacy", "euler", "verlet" and "rk4" (see integrators.py).
+            "legacy" reproduces Mover.update(), where forces are per tick;
+            the others scale the accelerations by dt.
+        collisions (Collisions, optional): Resolve body-to-body collisions
+            after every tick, see collisions.py
+        rng (numpy.random.Generator, optional): Random generator of the run,
+            e.g. for observers spawning bodies. Saved in snapshots so a resumed
+            run draws the same numbers.
+        profiler (Profiler, optional): Times every stage of every tick, see
+            profiling.py. Can be set or removed at any time.
+    """
+
+    def __init__(self, system, forces=(), boundary="bounce", integrator="legacy",
+                 collisions=None, rng=None, profiler=None):
+        self.system = system
+        if not isinstance(forces, ForceRegistry):
+            forces = ForceRegistry(forces)
+        self.forces = forces
+        self.boundary = get_boundary(boundary)
+        self.integrator = get_integrator(integrator)
+        self.collisions = collisions
+        self.rng = rng
+        self.profiler = profiler
+        self.observers = []
+        self.tick = 0
+        self.time = 0.0
+
+    def add_force(self, force, name=None):
+        """Adds a force model and returns it
+
+        Args:
+            force (Force): The force model
+            name (str, optional): Name of the force in the registry
+        """
+        return self.forces.register(force, name)
+
+    def add_observer(self, observer, every=1):
+        """Calls observer(simulation) after every few ticks
+
+        Args:
+            observer (callable): Function taking the simulation as argument
+            every (int, optional): Number of ticks between two calls
+        """
+        self.observers.append((observer, every))
+
+    def net_force(self, pos, velocity, index=None):
+        """Total force of all enabled force models at the given state
+
+        Args:
+            pos (numpy.ndarray): Position of every body, shape (N, 2)
+            velocity (numpy.ndarray): Velocity of every body, shape (N, 2)
+            index (numpy.ndarray, optional): Only compute the forces on these bodies
+
+        Returns:
+            numpy.ndarray: Net force on every body, shape (N, 2), or on the
+                           bodies of index
+        """
+        return self.forces.evaluate(self.system, pos, velocity, index=index)
+
+    def acceleration(self, pos, velocity, index=None):
+        """Acceleration of every body at the given state
+
+        Args:
+            pos (numpy.ndarray): Position of every body, shape (N, 2)
+            velocity (numpy.ndarray): Velocity of every body, shape (N, 2)
+            index (numpy.ndarray, optional): Only compute the accelerations of these bodies
+
+        Returns:
+            numpy.ndarray: Acceleration of every body, shape (N, 2), or of the
+                           bodies of index
+        """
+        total = self.net_force(pos, velocity, index)
+        mass = self.system.mass if index is None else self.system.mass[index]
+        total /= mass[:, None]
+        return total
+
+    def step(self, dt):
+        """Advances the simulation by one tick
+
+        Args:
+            dt (float): Duration of the tick in seconds
+        """
+        if self.profiler is not None:
+            self._profiled_step(dt, self.profiler)
+            return
+        if self.boundary is not None:
+            self.boundary.apply(self.system)
+        self.integrator.step(self.system, dt, self.acceleration)
+        if self.collisions is not None:
+            self.collisions.resolve(self.system)
+        self.finish_tick(dt)
+
+    def finish_tick(self, dt):
+        """Advances the clock by one tick and calls the observers that are due
+
+        The last stage of step(). Schedulers moving the bodies themselves,
+        e.g. AdaptiveTimestep, call it once the bodies are at the end of the tick.
+
+        Args:
+            dt (float): Duration of the tick in seconds
+        """
+        self.tick += 1
+        self.time += dt
+        for observer, every in self.observers:
+            if self.tick % every == 0:
+                observer(self)
+
+    def _profiled_step(self, dt, profiler):
+        """step(), recording the duration of every stage
+        """
+        clock = time.perf_counter
+        forces_time = 0.0
+
+        def acceleration(pos, velocity):
+            nonlocal forces_time
+            start = clock()
+            total = self.acceleration(pos, velocity)
+            forces_time += clock() - start
+            return total
+
+        start = clock()
+        if self.boundary is not None:
+            self.boundary.apply(self.system)
+        boundary_end = clock()
+        self.integrator.step(self.system, dt, acceleration)
+        integrate_end = clock()
+        if self.collisions is not None:
+            self.collisions.resolve(self.system)
+        collisions_end = clock()
+        self.finish_tick(dt)
+        end = clock()
+
+        profiler.record("boundary", boundary_end - start)
+        profiler.record("forces", forces_time)
+        profiler.record("integrate", integrate_end - boundary_end - forces_time)
+        profiler.record("collisions", collisions_end - integrate_end)
+        profiler.record("observers", end - collisions_end)
+        profiler.record("tick", end - start)
+
+    def run(self, ticks, dt=1/240.0):
+        """Advances the simulation by a fixed number of ticks
+
+        Args:
+            ticks (int): Number of ticks to run
+            dt (float, optional): Duration of every tick in seconds
+        """
+        for _ in range(ticks):
+            self.step(dt)
+
+
+if __name__ == "__main__":
+    import scenes
+
+    parser = argparse.ArgumentParser(description="Run a chapter 2 scene without a window")
+    parser.add_argument("scene", choices=sorted(scenes.SCENES))
+    parser.add_argument("--bodies", type=int, default=None,
+                        help="number of bodies, when the scene supports it")
+    parser.add_argument("--ticks", type=int, default=2400)
+    parser.add_argument("--dt", type=float, default=1/240.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--distribution", choices=("uniform", "ring", "clustered"), default=None,
+                        help="initial conditions, for the attraction scenes")
+    parser.add_argument("--integrator", choices=sorted(INTEGRATORS), default=None,
+                        help="override the integrator of the scene")
+    parser.add_argument("--backend", choices=BACKENDS, default=None,
+                        help="implementation of the kernels, see backends.py")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="threads computing the pair forces, 0 for one per CPU")
+    parser.add_argument("--profile", action="store_true",
+                        help="print the duration of every stage of a tick")
+    parser.add_argument("--boundary", choices=Boundary.MODES + ("none",), default=None,
+                        help="override the boundary of the scene")
+    args = parser.parse_args()
+
+    if args.backend is not None:
+        set_backend(args.backend)
+    if args.threads is not None:
+        set_threads(args.threads)
+    kwargs = {"seed": args.seed}
+    if args.bodies is not None:
+        kwargs["num"] = args.bodies
+    if args.distribution is not None:
+        if "distribution" not in inspect.signature(scenes.SCENES[args.scene]).parameters:
+            parser.error(f"--distribution is not supported by the {args.scene} scene")
+        kwargs["distribution"] = args.distribution
+    simulation = scenes.SCENES[args.scene](**kwargs)
+    if args.integrator is not None:
+        simulation.integrator = get_integrator(args.integrator)
+    if args.boundary is not None:
+        simulation.boundary = get_boundary(None if args.boundary == "none" else args.boundary)
+
+    if args.profile:
+        simulation.profiler = Profiler()
+
+    start = time.perf_counter()
+    simulation.run(args.ticks, args.dt)
+    elapsed = time.perf_counter() - start
+
+    system = simulation.system
+    print(f"{args.scene}: {len(system)} bodies, {args.ticks} ticks in {elapsed:.3f} s "
+          f"({args.ticks / elapsed:.1f} ticks/s)")
+    print(f"mean position {system.pos.mean(axis=0)}, "
+          f"mean speed {np.linalg.norm(system.velocity, axis=1).mean():.3f}")
+    if args.profile:
+        print(simulation.profiler.report())
@@ -0,0 +1,214 @@
+"""Save and resume the full state of a simulation
+
+A snapshot is a single binary file:
+
+    magic (8 bytes) | header length (uint64, little endian) | JSON header | arrays
+
+The JSON header holds everything that is not per body (tick, time, canvas,
+capacity, force configuration, integrator, boundary, collisions, random
+generator state, emitters) and the dtype, shape and offset of every array. The arrays follow,
+raw and aligned on 64 bytes, so they can be opened with np.memmap without
+being read or copied: load() returns as soon as the header is parsed, and
+the pages of the arrays are only read when touched.
+"""
+import argparse
+import json
+import numpy as np
+from particles import ParticleSystem
+from simulation import Simulation
+from forces import ForceRegistry
+from boundaries import Boundary
+from collisions import Collisions
+from emitter import Emitter
+
+MAGIC = b"PNOCSNAP"
+VERSION = 1
+ALIGNMENT = 64
+ARRAYS = ("mass", "pos", "velocity", "acceleration")
+
+# Observers that are part of the state of a scene, by config()["type"]
+OBSERVER_TYPES = {observer.kind: observer for observer in (Emitter,)}
+
+
+def save(simulation, path):
+    """Writes the state of a simulation to a snapshot file
+
+    Observers listed in OBSERVER_TYPES, e.g. emitters, are saved. The others
+    are not, they have to be added again after load().
+
+    Args:
+        simulation (Simulation): The simulation to save
+        path (str): The snapshot file
+    """
+    system = simulation.system
+    arrays = {name: np.ascontiguousarray(getattr(system, name), dtype="<f8")
+              for name in ARRAYS}
+    header = {"version": VERSION, **describe(simulation), "arrays": {}}
+
+    # Offsets are relative to the end of the header, padded to ALIGNMENT
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape),
+                                  "offset": offset}
+        offset = _align(offset + array.nbytes)
+
+    encoded = json.dumps(header).encode()
+    encoded += b" " * (_align(len(MAGIC) + 8 + len(encoded)) - len(MAGIC) - 8 - len(encoded))
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        file.write(np.array(len(encoded), dtype="<u8").tobytes())
+        file.write(encoded)
+        start = file.tell()
+        for name, array in arrays.items():
+            file.seek(start + header["arrays"][name]["offset"])
+            array.tofile(file)
+
+
+def describe(simulation):
+    """Everything about a simulation but its per body arrays, as plain JSON data
+
+    Args:
+        simulation (Simulation): The simulation
+
+    Returns:
+        dict: Tick, time, canvas, capacity, force configuration, integrator,
+              boundary, collisions, random generator state and the observers
+              of OBSERVER_TYPES
+    """
+    system = simulation.system
+    boundary = simulation.boundary
+    collisions = simulation.collisions
+    return {
+        "tick": simulation.tick,
+        "time": simulation.time,
+        "canvas_size": [system.canvas_w, system.canvas_h],
+        "radius_scale": system.radius_scale,
+        "capacity": system.capacity,
+        "forces": simulation.forces.config(),
+        "integrator": simulation.integrator.name,
+        "boundary": None if boundary is None else {"mode": boundary.mode,
+                                                   "restitution": boundary.restitution},
+        "collisions": None if collisions is None else {"restitution": collisions.restitution,
+                                                       "iterations": collisions.iterations},
+        "rng": None if simulation.rng is None else simulation.rng.bit_generator.state,
+        "observers": [{"every": every, **observer.config(system)}
+                      for observer, every in simulation.observers
+                      if isinstance(observer, tuple(OBSERVER_TYPES.values()))],
+    }
+
+
+def restore(arrays, description, copy=True):
+    """Builds a simulation from its arrays and describe() output
+
+    Args:
+        arrays (dict): "mass", "pos", "velocity" and "acceleration" arrays
+        description (dict): See describe()
+        copy (bool, optional): Copy the arrays, see ParticleSystem
+
+    Returns:
+        Simulation: The simulation
+    """
+    system = ParticleSystem(arrays["mass"], arrays["pos"], arrays["velocity"],
+                            canvas_size=tuple(description["canvas_size"]),
+                            radius_scale=description["radius_scale"],
+                            acceleration=arrays["acceleration"], copy=copy,
+                            capacity=description.get("capacity"))
+
+    rng = None
+    if description["rng"] is not None:
+        state = description["rng"]
+        rng = np.random.Generator(getattr(np.random, state["bit_generator"])())
+        rng.bit_generator.state = state
+
+    boundary = description["boundary"]
+    collisions = description["collisions"]
+    simulation = Simulation(system, ForceRegistry.from_config(description["forces"]),
+                            boundary=None if boundary is None else Boundary(**boundary),
+                            integrator=description["integrator"],
+                            collisions=None if collisions is None else Collisions(**collisions),
+                            rng=rng)
+    simulation.tick = description["tick"]
+    simulation.time = description["time"]
+    for config in description.get("observers", []):
+        observer = OBSERVER_TYPES[config["type"]].from_config(config, system)
+        simulation.add_observer(observer, config["every"])
+    return simulation
+
+
+def read_header(path):
+    """Reads the JSON header of a snapshot
+
+    Args:
+        path (str): The snapshot file
+
+    Returns:
+        dict: The header, plus the position of the arrays in the file as "data_offset"
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a snapshot file")
+        length = int(np.frombuffer(file.read(8), dtype="<u8")[0])
+        header = json.loads(file.read(length))
+    header["data_offset"] = len(MAGIC) + 8 + length
+    if header["version"] != VERSION:
+        raise ValueError(f"Unsupported snapshot version {header['version']}")
+    return header
+
+
+def open_arrays(path, mode="r"):
+    """Memory-maps the per body arrays of a snapshot, without reading them
+
+    This is the entry point of analysis tools: a snapshot of a million
+    bodies is opened instantly and only the pages actually used are read.
+
+    Args:
+        path (str): The snapshot file
+        mode (str, optional): np.memmap mode. "r" is read only, "c" is copy on
+                              write (changes stay in memory), "r+" writes the
+                              changes back to the file.
+
+    Returns:
+        dict: Memory-mapped "mass", "pos", "velocity" and "acceleration" arrays
+    """
+    header = read_header(path)
+    return {name: np.memmap(path, dtype=np.dtype(spec["dtype"]), mode=mode,
+                            offset=header["data_offset"] + spec["offset"],
+                            shape=tuple(spec["shape"]))
+            for name, spec in header["arrays"].items()}
+
+
+def load(path, mode="c"):
+    """Resumes a simulation from a snapshot
+
+    The particle system uses the memory-mapped arrays directly. With the
+    default copy on write mode, stepping the simulation never modifies the
+    file. Use mode "r+" to update the snapshot in place. A system saved with
+    spare capacity, e.g. with an emitter, is copied into new buffers instead.
+
+    Args:
+        path (str): The snapshot file
+        mode (str, optional): np.memmap mode of the arrays, "c" or "r+"
+
+    Returns:
+        Simulation: The simulation, at the tick it was saved
+    """
+    return restore(open_arrays(path, mode), read_header(path), copy=False)
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print a summary of a snapshot")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    header = read_header(args.path)
+    arrays = open_arrays(args.path)
+    mass, velocity = arrays["mass"], arrays["velocity"]
+    print(f"tick {header['tick']}, time {header['time']:.3f} s, {len(mass)} bodies")
+    print(f"integrator {header['integrator']}, boundary {header['boundary']}, "
+          f"forces {sorted(header['forces'])}")
+    print(f"total mass {mass.sum():.1f}, "
+          f"momentum {(mass[:, None] * velocity).sum(axis=0)}")
@@ -0,0 +1,196 @@
+import numpy as np
+
+# Cell keys pack the cell column in the high 32 bits and the row in the low ones
+_ROW_OFFSET = 2**31
+_COLUMN = 2**32
+
+# Half of the 3x3 neighbourhood, so that every pair of cells is visited once
+_HALF_NEIGHBOURHOOD = ((1, -1), (1, 0), (1, 1), (0, 1))
+
+
+class SpatialHash:
+    """Uniform grid bucketing bodies by the cell they are in
+
+    The bodies are sorted by cell key, so the bodies of a cell are a
+    contiguous range of the sorted order, found with a binary search. With a
+    cell size at least the largest interaction distance (e.g. twice the
+    largest radius for collisions), bodies closer than that are always in
+    the same or in adjacent cells.
+
+    The hash also answers point queries, query_radius() and nearest(), for
+    the positions given to the last build() or update(). Their cost depends
+    on the number of bodies near the point, not on the total number.
+
+    Args:
+        cell_size (float): Side of a grid cell in pixels
+    """
+
+    def __init__(self, cell_size):
+        if cell_size <= 0:
+            raise ValueError("cell_size has to be positive")
+        self.cell_size = float(cell_size)
+        self.order = np.empty(0, dtype=np.int64)
+        self.keys = np.empty(0, dtype=np.int64)
+        self.pos = np.empty((0, 2))
+
+    def cell_keys(self, pos):
+        """Key of the cell of every position
+
+        Args:
+            pos (numpy.ndarray): Positions, shape (N, 2)
+
+        Returns:
+            numpy.ndarray: Cell key of every position, shape (N,)
+        """
+        cell = np.floor(np.asarray(pos) / self.cell_size).astype(np.int64)
+        return cell[:, 0] * _COLUMN + (cell[:, 1] + _ROW_OFFSET)
+
+    def build(self, pos):
+        """Buckets the bodies by cell
+
+        Args:
+            pos (numpy.ndarray): Position of every body, shape (N, 2)
+        """
+        keys = self.cell_keys(pos)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+        self.pos = pos
+        return self
+
+    def update(self, pos):
+        """Buckets the bodies again after they moved, starting from the last order
+
+        Between two ticks few bodies change cell, so the previous order is
+        nearly sorted by the new keys: it is kept as is when still sorted,
+        and otherwise re-sorted with a stable sort, which is close to linear
+        on such input. Falls back to build() when the number of bodies changed.
+
+        Args:
+            pos (numpy.ndarray): Position of every body, shape (N, 2)
+        """
+        if len(pos) != len(self.order):
+            return self.build(pos)
+        keys = self.cell_keys(pos)[self.order]
+        if np.any(keys[1:] < keys[:-1]):
+            resort = np.argsort(keys, kind="stable")
+            self.order = self.order[resort]
+            keys = keys[resort]
+        self.keys = keys
+        self.pos = pos
+        return self
+
+    def candidates(self, point, radius):
+        """Bodies in the cells overlapping the square around a disc
+
+        Args:
+            point (tuple): Centre of the disc
+            radius (float): Radius of the disc
+
+        Returns:
+            numpy.ndarray: Indices of the bodies, a superset of the bodies in the disc
+        """
+        if not len(self.keys):
+            return np.empty(0, dtype=np.int64)
+        x, y = point
+        size = self.cell_size
+        # No need to look at columns without any body, nor past the range of the keys
+        first, last = self.keys[0] // _COLUMN, self.keys[-1] // _COLUMN
+        columns = np.arange(int(max(np.floor((x - radius) / size), first)),
+                            int(min(np.floor((x + radius) / size), last)) + 1)
+        low = int(max(np.floor((y - radius) / size), -_ROW_OFFSET)) + _ROW_OFFSET
+        high = int(min(np.floor((y + radius) / size), _ROW_OFFSET - 1)) + _ROW_OFFSET
+
+        # The cells of a column between two rows are a contiguous range of keys
+        start = np.searchsorted(self.keys, columns * _COLUMN + low, "left")
+        stop = np.searchsorted(self.keys, columns * _COLUMN + high, "right")
+        return self.order[expand_ranges(start, stop - start)]
+
+    def query_radius(self, point, radius):
+        """Bodies within a distance of a point
+
+        Args:
+            point (tuple): The point
+            radius (float): The distance
+
+        Returns:
+            numpy.ndarray: Indices of the bodies, in no particular order
+        """
+        index = self.candidates(point, radius)
+        delta = self.pos[index] - np.asarray(point, dtype=float)
+        return index[np.einsum("ij,ij->i", delta, delta) <= radius * radius]
+
+    def nearest(self, point, max_distance=np.inf):
+        """Body closest to a point
+
+        Searches squares of growing size around the point until one holds a
+        body closer than its half side.
+
+        Args:
+            point (tuple): The point
+            max_distance (float, optional): Ignore bodies farther than this
+
+        Returns:
+            int: Index of the body, -1 when there is none within max_distance
+        """
+        point = np.asarray(point, dtype=float)
+        radius = min(self.cell_size, max_distance)
+        while len(self.keys):
+            index = self.candidates(point, radius)
+            if len(index):
+                delta = self.pos[index] - point
+                distance_sq = np.einsum("ij,ij->i", delta, delta)
+                best = np.argmin(distance_sq)
+                # Past the square of the radius, a closer body may be in other cells,
+                # unless all bodies were candidates
+                if distance_sq[best] <= radius * radius or len(index) == len(self.keys):
+                    if distance_sq[best] > max_distance * max_distance:
+                        return -1
+                    return int(index[best])
+            if radius >= max_distance:
+                break
+            radius = min(2 * radius, max_distance)
+        return -1
+
+    def candidate_pairs(self):
+        """Pairs of bodies in the same or in adjacent cells
+
+        Every pair is returned once. Call build() first.
+
+        Returns:
+            tuple: Two arrays (i, j) of body indices
+        """
+        num = len(self.keys)
+        sorted_index = np.arange(num)
+
+        # Same cell: every body with the ones after it in the sorted order
+        stop = np.searchsorted(self.keys, self.keys, "right")
+        firsts = [sorted_index]
+        seconds = [sorted_index + 1]
+        counts = [stop - sorted_index - 1]
+
+        for column, row in _HALF_NEIGHBOURHOOD:
+            neighbour = self.keys + column * _COLUMN + row
+            start = np.searchsorted(self.keys, neighbour, "left")
+            stop = np.searchsorted(self.keys, neighbour, "right")
+            firsts.append(sorted_index)
+            seconds.append(start)
+            counts.append(stop - start)
+
+        count = np.concatenate(counts)
+        first = np.repeat(np.concatenate(firsts), count)
+        second = expand_ranges(np.concatenate(seconds), count)
+        return self.order[first], self.order[second]
+
+
+def expand_ranges(start, count):
+    """Concatenates the ranges start[i]:start[i]+count[i]
+
+    Args:
+        start (numpy.ndarray): First value of every range
+        count (numpy.ndarray): Length of every range
+
+    Returns:
+        numpy.ndarray: All the values of the ranges, one after the other
+    """
+    offset = np.cumsum(count) - count
+    return np.repeat(start - offset, count) + np.arange(count.sum())
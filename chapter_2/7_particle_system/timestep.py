@@ -0,0 +1,102 @@
+import numpy as np
+
+
+class FixedTimestep:
+    """Runs a simulation at a fixed rate, whatever the frame rate of the display
+
+    The time elapsed between two frames is added to an accumulator, and the
+    simulation is stepped with a constant dt while the accumulator holds at
+    least one step. The physics is then independent of frame jitter, and its
+    cost depends only on the simulated rate.
+
+    The time left in the accumulator is used to interpolate the drawn positions
+    between the last two physics states, so motion stays smooth when the
+    display and physics rates differ.
+
+    Args:
+        simulation (Simulation): The simulation to advance
+        step (float, optional): Fixed duration of a physics step in seconds
+        max_substeps (int, optional): Maximum number of steps taken per frame.
+                                      When the physics can't keep up, the extra
+                                      time is dropped instead of accumulating
+                                      (the "spiral of death").
+    """
+
+    def __init__(self, simulation, step=1/240.0, max_substeps=8):
+        self.simulation = simulation
+        self.step = step
+        self.max_substeps = max_substeps
+        self.accumulator = 0.0
+        self.dropped_time = 0.0
+        self._previous = np.empty(0)
+        self._revision = None
+        self._store_previous()
+
+    @property
+    def alpha(self):
+        """Fraction of a step between the previous and the current state
+        """
+        return self.accumulator / self.step
+
+    def advance(self, dt):
+        """Advances the simulation by the time elapsed since the last frame
+
+        Args:
+            dt (float): The number of seconds since the last frame.
+                        Typically obtained from pyglet.clock.schedule()
+
+        Returns:
+            int: Number of physics steps taken
+        """
+        self.accumulator += dt
+        steps = 0
+        while self.accumulator >= self.step and steps < self.max_substeps:
+            self._store_previous()
+            self.simulation.step(self.step)
+            self.accumulator -= self.step
+            steps += 1
+
+        # Drop the time the physics could not catch up with
+        if self.accumulator >= self.step:
+            dropped = self.accumulator - self.accumulator % self.step
+            self.dropped_time += dropped
+            self.accumulator -= dropped
+        return steps
+
+    def _store_previous(self, pos=None):
+        # Keeps the positions before a step, in a buffer as large as the storage,
+        # and the handles of their bodies in case rows change during the step
+        system = self.simulation.system
+        if len(self._previous) < system.capacity:
+            self._previous = np.empty_like(system.storage["pos"])
+        self.previous_pos = self._previous[:len(system)]
+        self.previous_pos[:] = system.pos if pos is None else pos
+        if self._revision != system.revision:
+            self._handles = system.handles()
+            self._revision = system.revision
+
+    def interpolated_pos(self, out=None):
+        """Positions to draw, blended between the last two physics states
+
+        Args:
+            out (numpy.ndarray, optional): Array of shape (N, 2) to write the positions in
+
+        Returns:
+            numpy.ndarray: Interpolated position of every body, shape (N, 2)
+        """
+        system = self.simulation.system
+        pos = system.pos
+        if self._revision != system.revision:
+            # Bodies were added or removed during the last step: find the previous
+            # position of the remaining ones by handle, new ones are not blended
+            rows = system.rows(self._handles)
+            kept = rows >= 0
+            previous = pos.copy()
+            previous[rows[kept]] = self.previous_pos[kept]
+            self._store_previous(previous)
+        if out is None:
+            out = np.empty_like(pos)
+        np.subtract(pos, self.previous_pos, out=out)
+        out *= self.alpha
+        out += self.previous_pos
+        return out
@@ -0,0 +1,278 @@
+"""Record the trajectories of the bodies to disk while the simulation runs
+
+At 240 ticks/s, appending the positions of every body to Python lists fills
+the memory within minutes. TrajectoryRecorder instead copies every recorded
+tick into a preallocated chunk of fixed size. Full chunks are compressed and
+written by a background thread, so memory stays bounded and the simulation
+does not wait for the disk.
+
+A trajectory file is:
+
+    magic (8 bytes) | header length (uint64) | JSON header | chunk | chunk | ...
+
+and every chunk is:
+
+    compressed length (uint64) | ticks (uint32) | bodies (uint32) | zlib data
+
+where the data holds the tick numbers (int64), the handles of the bodies
+(int64, see ParticleSystem.handles()) and one array of shape (ticks, bodies,
+2) per recorded field. A new chunk starts whenever the recorded bodies
+change, e.g. when bodies are spawned or despawned. read_chunks() yields the
+chunks one at a time.
+"""
+import argparse
+import json
+import queue
+import struct
+import threading
+import zlib
+import numpy as np
+
+MAGIC = b"PNOCTRAJ"
+VERSION = 2
+_CHUNK_HEADER = struct.Struct("<QII")
+
+
+class TrajectoryRecorder:
+    """Buffers ticks into chunks and flushes them to a file in a background thread
+
+    Use as an observer of a simulation, e.g. with attach(), and close() it
+    (or use it as a context manager) once the run is over.
+
+    Args:
+        path (str): The trajectory file
+        chunk_ticks (int, optional): Number of recorded ticks per chunk
+        every (int, optional): Record one tick out of every, used by attach()
+        bodies (array_like, optional): Handles of the bodies to record, all by
+                                       default. Bodies that are despawned stop
+                                       being recorded. Until something is
+                                       spawned or despawned, the handles of a
+                                       system are its row indices.
+        fields (tuple, optional): Arrays of the system to record, "pos"
+                                  and/or "velocity"
+        dtype (numpy.dtype, optional): Storage type, e.g. np.float16 to
+                                       divide the size by four
+        compression (int, optional): zlib compression level, 0 to 9
+        max_pending (int, optional): Number of full chunks waiting to be
+                                     written before recording blocks
+    """
+
+    def __init__(self, path, chunk_ticks=240, every=1, bodies=None, fields=("pos",),
+                 dtype=np.float32, compression=6, max_pending=4):
+        self.path = path
+        self.chunk_ticks = chunk_ticks
+        self.every = every
+        self.bodies = None if bodies is None else np.asarray(bodies, dtype=np.int64)
+        self.fields = tuple(fields)
+        self.dtype = np.dtype(dtype)
+        self.compression = compression
+        self.chunks = 0
+        self.ticks = 0
+
+        self._file = open(path, "wb")
+        header = json.dumps({
+            "version": VERSION,
+            "fields": self.fields,
+            "dtype": self.dtype.str,
+            "every": every,
+            "bodies": None if self.bodies is None else self.bodies.tolist(),
+        }).encode()
+        self._file.write(MAGIC + struct.pack("<Q", len(header)) + header)
+
+        self._tick = None
+        self._buffers = None
+        self._filled = 0
+        # Handles and rows of the recorded bodies, for the revision of the system
+        self._handles = None
+        self._rows = None
+        self._revision = None
+        self._system = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __call__(self, simulation):
+        self.record(simulation.system, simulation.tick)
+
+    def attach(self, simulation):
+        """Records the simulation every few ticks, see Simulation.add_observer()
+
+        Args:
+            simulation (Simulation): The simulation to record
+
+        Returns:
+            TrajectoryRecorder: self
+        """
+        simulation.add_observer(self, self.every)
+        return self
+
+    def record(self, system, tick):
+        """Copies the current state of the bodies into the chunk being filled
+
+        Args:
+            system (ParticleSystem): The bodies
+            tick (int): Number of the tick
+        """
+        if self._error is not None:
+            raise self._error
+        if system is not self._system or system.revision != self._revision:
+            # Bodies were spawned or despawned since the last tick: find the rows again
+            if self.bodies is None:
+                handles, rows = system.handles(), None
+            else:
+                rows = system.rows(self.bodies)
+                handles = self.bodies[rows >= 0]
+                rows = rows[rows >= 0]
+            if self._buffers is not None and not np.array_equal(handles, self._handles):
+                # A chunk holds the same bodies on every tick, start another one
+                self.flush()
+            self._handles, self._rows = handles, rows
+            self._system, self._revision = system, system.revision
+        if self._buffers is None:
+            num = len(self._handles)
+            self._tick = np.empty(self.chunk_ticks, dtype=np.int64)
+            self._buffers = [np.empty((self.chunk_ticks, num, 2), dtype=self.dtype)
+                             for _ in self.fields]
+
+        row = self._filled
+        self._tick[row] = tick
+        for field, buffer in zip(self.fields, self._buffers):
+            values = getattr(system, field)
+            buffer[row] = values if self._rows is None else values[self._rows]
+        self._filled += 1
+        self.ticks += 1
+        if self._filled == self.chunk_ticks:
+            self.flush()
+
+    def flush(self):
+        """Hands the ticks recorded so far to the writer thread
+        """
+        if self._filled:
+            filled = self._filled
+            self._queue.put((self._tick[:filled], self._handles,
+                             [b[:filled] for b in self._buffers]))
+            self.chunks += 1
+        # The writer owns the queued buffers, the next tick goes to new ones
+        self._tick = None
+        self._buffers = None
+        self._filled = 0
+
+    def close(self):
+        """Writes the last partial chunk and waits for the writer thread
+        """
+        if self._thread.is_alive():
+            self.flush()
+            self._queue.put(None)
+            self._thread.join()
+            self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is None:
+                try:
+                    self._write(*item)
+                except Exception as error:
+                    self._error = error
+
+    def _write(self, tick, handles, buffers):
+        data = b"".join([tick.tobytes(), handles.astype(np.int64).tobytes()]
+                        + [b.tobytes() for b in buffers])
+        data = zlib.compress(data, self.compression)
+        self._file.write(_CHUNK_HEADER.pack(len(data), len(tick), len(handles)))
+        self._file.write(data)
+
+
+def read_header(path):
+    """Reads the JSON header of a trajectory file
+
+    Args:
+        path (str): The trajectory file
+
+    Returns:
+        dict: The header
+    """
+    with open(path, "rb") as file:
+        return _read_header(file, path)
+
+
+def read_chunks(path):
+    """Yields the chunks of a trajectory file one by one
+
+    Only one chunk is held in memory at a time, whatever the length of the run.
+
+    Args:
+        path (str): The trajectory file
+
+    Yields:
+        dict: "tick", the tick numbers, shape (T,), "handles", the handle of
+              every recorded body, shape (bodies,), and one array of shape
+              (T, bodies, 2) per recorded field, e.g. "pos"
+    """
+    with open(path, "rb") as file:
+        header = _read_header(file, path)
+        dtype = np.dtype(header["dtype"])
+        while True:
+            raw = file.read(_CHUNK_HEADER.size)
+            if len(raw) < _CHUNK_HEADER.size:
+                return
+            length, ticks, bodies = _CHUNK_HEADER.unpack(raw)
+            data = zlib.decompress(file.read(length))
+
+            chunk = {"tick": np.frombuffer(data, dtype=np.int64, count=ticks)}
+            offset = chunk["tick"].nbytes
+            chunk["handles"] = np.frombuffer(data, dtype=np.int64, count=bodies, offset=offset)
+            offset += chunk["handles"].nbytes
+            for field in header["fields"]:
+                values = np.frombuffer(data, dtype=dtype, count=ticks*bodies*2, offset=offset)
+                chunk[field] = values.reshape(ticks, bodies, 2)
+                offset += values.nbytes
+            yield chunk
+
+
+def _read_header(file, path):
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{path} is not a trajectory file")
+    length, = struct.unpack("<Q", file.read(8))
+    header = json.loads(file.read(length))
+    if header["version"] != VERSION:
+        raise ValueError(f"Unsupported trajectory version {header['version']}")
+    return header
+
+
+if __name__ == "__main__":
+    import time
+    import scenes
+
+    parser = argparse.ArgumentParser(description="Record the trajectories of a chapter 2 scene")
+    parser.add_argument("scene", choices=sorted(scenes.SCENES))
+    parser.add_argument("output")
+    parser.add_argument("--bodies", type=int, default=None)
+    parser.add_argument("--ticks", type=int, default=2400)
+    parser.add_argument("--every", type=int, default=1)
+    parser.add_argument("--dtype", choices=("float16", "float32", "float64"), default="float32")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    kwargs = {"seed": args.seed}
+    if args.bodies is not None:
+        kwargs["num"] = args.bodies
+    simulation = scenes.SCENES[args.scene](**kwargs)
+
+    start = time.perf_counter()
+    with TrajectoryRecorder(args.output, every=args.every, dtype=args.dtype) as recorder:
+        recorder.attach(simulation)
+        simulation.run(args.ticks)
+    elapsed = time.perf_counter() - start
+    print(f"{recorder.ticks} ticks in {recorder.chunks} chunks, {elapsed:.3f} s")
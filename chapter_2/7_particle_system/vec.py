@@ -0,0 +1,329 @@
+"""Mutable Vec2-compatible views of the rows of the particle arrays
+
+The Mover of the chapter 2 scripts holds pyglet Vec2 objects and every
+operation on them (self.velocity + self.acceleration, from_magnitude(),
+normalize(), ...) allocates a new immutable Vec2. VecView exposes one row of
+a (N, 2) array of a ParticleSystem with the same attributes and methods,
+so that code keeps working on the shared storage:
+
+- the operators and methods of Vec2 (+, -, *, /, mag, heading, normalize(),
+  from_magnitude(), rotate(), limit(), ...) return new Vec2 values, exactly
+  like Vec2 does
+- the in-place operators (+=, -=, *=, /=) and the *_ip() variants of the
+  methods (normalize_ip(), from_magnitude_ip(), rotate_ip(), ...) write the
+  result into the row and allocate nothing
+
+Without pyglet the copying operations return numpy arrays of shape (2,).
+"""
+import math
+import numpy as np
+
+try:
+    from pyglet.math import Vec2
+except Exception:
+    Vec2 = None
+
+
+def _vec(x, y):
+    if Vec2 is None:
+        return np.array((x, y), dtype=float)
+    return Vec2(x, y)
+
+
+def _components(other):
+    """x and y of a Vec2, a VecView or any sequence of two numbers
+    """
+    if isinstance(other, VecView):
+        return other.array.item(other.index, 0), other.array.item(other.index, 1)
+    if Vec2 is not None and isinstance(other, Vec2):
+        return other.x, other.y
+    x, y = other
+    return x, y
+
+
+class VecView:
+    """A 2D vector stored in the row of an array, with the interface of pyglet Vec2
+
+    Args:
+        array (numpy.ndarray): Array of shape (N, 2), e.g. ParticleSystem.pos
+        index (int): Row of the vector
+    """
+
+    __slots__ = ("array", "index")
+
+    def __init__(self, array, index):
+        self.array = array
+        self.index = index
+
+    @property
+    def x(self):
+        return self.array.item(self.index, 0)
+
+    @x.setter
+    def x(self, value):
+        self.array[self.index, 0] = value
+
+    @property
+    def y(self):
+        return self.array.item(self.index, 1)
+
+    @y.setter
+    def y(self, value):
+        self.array[self.index, 1] = value
+
+    def set(self, other):
+        """Overwrites the row with the components of another vector
+
+        Args:
+            other (Vec2, VecView or sequence): The new value
+
+        Returns:
+            VecView: self
+        """
+        x, y = _components(other)
+        self.array[self.index, 0] = x
+        self.array[self.index, 1] = y
+        return self
+
+    def copy(self):
+        """Returns the current value as a new Vec2, detached from the array
+        """
+        return _vec(self.x, self.y)
+
+    def __repr__(self):
+        return f"VecView({self.x}, {self.y})"
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self.array[self.index], dtype=dtype)
+
+    def __iter__(self):
+        yield self.x
+        yield self.y
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, item):
+        return (self.x, self.y)[item]
+
+    def __eq__(self, other):
+        try:
+            x, y = _components(other)
+        except (TypeError, ValueError):
+            return NotImplemented
+        return self.x == x and self.y == y
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    # Mutable, so not hashable
+    __hash__ = None
+
+    # Operators returning new vectors, as Vec2
+
+    def __add__(self, other):
+        x, y = _components(other)
+        return _vec(self.x + x, self.y + y)
+
+    def __radd__(self, other):
+        # sum() starts with 0
+        if isinstance(other, (int, float)) and other == 0:
+            return self.copy()
+        return self.__add__(other)
+
+    def __sub__(self, other):
+        x, y = _components(other)
+        return _vec(self.x - x, self.y - y)
+
+    def __rsub__(self, other):
+        x, y = _components(other)
+        return _vec(x - self.x, y - self.y)
+
+    def __mul__(self, scalar):
+        return _vec(self.x * scalar, self.y * scalar)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, scalar):
+        return _vec(self.x / scalar, self.y / scalar)
+
+    def __floordiv__(self, scalar):
+        return _vec(self.x // scalar, self.y // scalar)
+
+    def __neg__(self):
+        return _vec(-self.x, -self.y)
+
+    def __abs__(self):
+        return math.sqrt(self.x ** 2 + self.y ** 2)
+
+    def __round__(self, ndigits=None):
+        return _vec(round(self.x, ndigits), round(self.y, ndigits))
+
+    # In-place operators, writing to the array
+
+    def __iadd__(self, other):
+        x, y = _components(other)
+        self.array[self.index, 0] += x
+        self.array[self.index, 1] += y
+        return self
+
+    def __isub__(self, other):
+        x, y = _components(other)
+        self.array[self.index, 0] -= x
+        self.array[self.index, 1] -= y
+        return self
+
+    def __imul__(self, scalar):
+        self.array[self.index, 0] *= scalar
+        self.array[self.index, 1] *= scalar
+        return self
+
+    def __itruediv__(self, scalar):
+        self.array[self.index, 0] /= scalar
+        self.array[self.index, 1] /= scalar
+        return self
+
+    def add_scaled_ip(self, other, scale):
+        """Adds other * scale without creating the intermediate vector
+
+        Args:
+            other (Vec2, VecView or sequence): The vector to add
+            scale (float): Factor of other
+
+        Returns:
+            VecView: self
+        """
+        x, y = _components(other)
+        self.array[self.index, 0] += x * scale
+        self.array[self.index, 1] += y * scale
+        return self
+
+    # Vec2 properties and methods
+
+    @property
+    def mag(self):
+        """The length of the vector, alias of abs(self)
+        """
+        return self.__abs__()
+
+    @property
+    def heading(self):
+        """The angle of the vector in radians
+        """
+        return math.atan2(self.y, self.x)
+
+    @staticmethod
+    def from_polar(mag, angle):
+        return _vec(mag * math.cos(angle), mag * math.sin(angle))
+
+    def dot(self, other):
+        x, y = _components(other)
+        return self.x * x + self.y * y
+
+    def distance(self, other):
+        x, y = _components(other)
+        return math.sqrt((x - self.x) ** 2 + (y - self.y) ** 2)
+
+    def normalize(self):
+        d = self.__abs__()
+        if d:
+            return _vec(self.x / d, self.y / d)
+        return self.copy()
+
+    def normalize_ip(self):
+        """Makes the vector a unit vector with the same heading, a zero vector is kept
+
+        Returns:
+            VecView: self
+        """
+        d = self.__abs__()
+        if d:
+            self.array[self.index, 0] /= d
+            self.array[self.index, 1] /= d
+        return self
+
+    def from_magnitude(self, magnitude):
+        return self.normalize() * magnitude
+
+    def from_magnitude_ip(self, magnitude):
+        """Scales the vector to a magnitude, keeping its heading
+
+        Returns:
+            VecView: self
+        """
+        self.normalize_ip()
+        self.array[self.index, 0] *= magnitude
+        self.array[self.index, 1] *= magnitude
+        return self
+
+    def from_heading(self, heading):
+        mag = self.__abs__()
+        return _vec(mag * math.cos(heading), mag * math.sin(heading))
+
+    def from_heading_ip(self, heading):
+        """Turns the vector to a heading, keeping its magnitude
+
+        Returns:
+            VecView: self
+        """
+        mag = self.__abs__()
+        self.array[self.index, 0] = mag * math.cos(heading)
+        self.array[self.index, 1] = mag * math.sin(heading)
+        return self
+
+    def rotate(self, angle):
+        mag = self.mag
+        heading = self.heading
+        return _vec(mag * math.cos(heading + angle), mag * math.sin(heading + angle))
+
+    def rotate_ip(self, angle):
+        """Rotates the vector by an angle in radians, keeping its magnitude
+
+        Returns:
+            VecView: self
+        """
+        return self.from_heading_ip(self.heading + angle)
+
+    def limit(self, maximum):
+        if self.x ** 2 + self.y ** 2 > maximum * maximum:
+            return self.from_magnitude(maximum)
+        return self.copy()
+
+    def limit_ip(self, maximum):
+        """Limits the magnitude of the vector to maximum
+
+        Returns:
+            VecView: self
+        """
+        if self.x ** 2 + self.y ** 2 > maximum * maximum:
+            self.from_magnitude_ip(maximum)
+        return self
+
+    def lerp(self, other, alpha):
+        x, y = _components(other)
+        return _vec(self.x + alpha * (x - self.x), self.y + alpha * (y - self.y))
+
+    def lerp_ip(self, other, alpha):
+        """Moves the vector by alpha of the way to other
+
+        Returns:
+            VecView: self
+        """
+        x, y = _components(other)
+        self.array[self.index, 0] += alpha * (x - self.x)
+        self.array[self.index, 1] += alpha * (y - self.y)
+        return self
+
+    def clamp(self, min_val, max_val):
+        return _vec(min(max(self.x, min_val), max_val), min(max(self.y, min_val), max_val))
+
+    def clamp_ip(self, min_val, max_val):
+        """Restricts both components to [min_val, max_val]
+
+        Returns:
+            VecView: self
+        """
+        self.x = min(max(self.x, min_val), max_val)
+        self.y = min(max(self.y, min_val), max_val)
+        return self